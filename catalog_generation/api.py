@@ -13,7 +13,8 @@ from fastapi.responses import StreamingResponse, FileResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import json
-from .utils.mcp_utils import sse, mcp_read_file, mcp_smart_write
+from .utils.mcp_utils import sse, sse_static, mcp_read_file, mcp_smart_write, close_http_client
+from .utils.file_utils import dump_artifact
 from fastmcp import Client as MCPClient
 import os
 
@@ -51,7 +52,7 @@ async def run_full_catalog_pipeline(model: str, language: str):
         yield event
     
     # 5. 合并所有最终目录
-    yield sse("phase_start", {"name": "合并最终目录"})
+    yield sse_static("phase_start", name="合并最终目录")
     try:
         full_catalog = []
         paths_to_merge = [
@@ -76,13 +77,13 @@ async def run_full_catalog_pipeline(model: str, language: str):
                 json.dumps(full_catalog, ensure_ascii=False, indent=2)
             )
         
-        yield sse("artifact", {"type": "file", "filename": full_catalog_path})
-        yield sse("note", {"phase": "合并最终目录", "text": "所有目录已成功合并。"})
+        yield sse_static("artifact", type="file", filename=full_catalog_path)
+        yield sse_static("note", phase="合并最终目录", text="所有目录已成功合并。")
     except Exception as e:
         yield sse("error", {"message": f"合并最终目录失败: {e}"})
 
-    yield sse("phase_end", {"name": "合并最终目录"})
-    yield sse("complete", {"final_output": "完整目录已成功生成！"})
+    yield sse_static("phase_end", name="合并最终目录")
+    yield sse_static("complete", final_output="完整目录已成功生成！")
 
 
 app = FastAPI()
@@ -96,6 +97,11 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有头
 )
 
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    # 关闭 LLM 调用共享的 HTTP 连接池
+    await close_http_client()
+
 @app.get("/")
 async def serve_homepage():
     return FileResponse("catalog_generation/catalog_debug.html")
@@ -139,13 +145,13 @@ async def run_framework_pipeline(model: str, language: str):
             yield event_str
     else:
         # 如果第一阶段失败，发送警告并正常结束流程
-        yield sse("warning", {"phase": "添加目录内容描述", "text": "未能从格式提取阶段获取有效框架，跳过描述生成。"})
-        yield sse("complete", {"final_output": "流程因第一阶段未产出有效结果而中止。"})
+        yield sse_static("warning", phase="添加目录内容描述", text="未能从格式提取阶段获取有效框架，跳过描述生成。")
+        yield sse_static("complete", final_output="流程因第一阶段未产出有效结果而中止。")
         return
     
     # 阶段 1.8: 目录补偿与分类（新增）
-    yield sse("note", {"phase": "流程控制", "text": "✅ 准备进入补偿逻辑..."})
-    yield sse("phase_start", {"name": "目录补偿与分类"})
+    yield sse_static("note", phase="流程控制", text="✅ 准备进入补偿逻辑...")
+    yield sse_static("phase_start", name="目录补偿与分类")
     
     # 重新读取最新的 format_framework（阶段1.5可能已更新）
     try:
@@ -156,7 +162,7 @@ async def run_framework_pipeline(model: str, language: str):
                 format_framework = json.loads(framework_content)
                 yield sse("note", {"phase": "目录补偿", "text": f"✅ 成功读取框架,共 {len(format_framework)} 个顶层节点"})
             else:
-                yield sse("warning", {"phase": "目录补偿", "text": "⚠️ 文件内容为空"})
+                yield sse_static("warning", phase="目录补偿", text="⚠️ 文件内容为空")
     except Exception as e:
         import traceback
         error_detail = traceback.format_exc()
@@ -164,7 +170,7 @@ async def run_framework_pipeline(model: str, language: str):
         yield sse("warning", {"phase": "目录补偿", "text": f"详细错误:\n{error_detail}"})
     
     if format_framework:
-        yield sse("note", {"phase": "目录补偿", "text": "✅ 框架数据有效,开始补偿流程"})
+        yield sse_static("note", phase="目录补偿", text="✅ 框架数据有效,开始补偿流程")
         try:
             from .compensation.orchestrator import CompensationOrchestrator
             
@@ -176,12 +182,12 @@ async def run_framework_pipeline(model: str, language: str):
             log_file = os.path.join(log_dir, "compensation_log.txt")
             
             yield sse("note", {"phase": "目录补偿", "text": f"开始分析和补偿目录结构,共 {len(format_framework)} 个顶层节点"})
-            yield sse("note", {"phase": "目录补偿", "text": "🤖 ReAct Agent 正在分析目录结构..."})
-            yield sse("note", {"phase": "目录补偿", "text": "⏳ 这可能需要 30-60 秒,请耐心等待..."})
+            yield sse_static("note", phase="目录补偿", text="🤖 ReAct Agent 正在分析目录结构...")
+            yield sse_static("note", phase="目录补偿", text="⏳ 这可能需要 30-60 秒,请耐心等待...")
             
             # 创建日志收集器
-            import uuid
-            log_id = f"log-{uuid.uuid4()}"
+            from secrets import token_hex
+            log_id = f"log-{token_hex(8)}"
             agent_logs = []
             
             yield sse("debug_log", {"title": "ReAct Agent 推理过程", "log_id": log_id})
@@ -204,7 +210,7 @@ async def run_framework_pipeline(model: str, language: str):
             
             elapsed = time.time() - start_time
             yield sse("note", {"phase": "目录补偿", "text": f"⏱️ 完成时间: {time.strftime('%H:%M:%S')} (耗时 {elapsed:.1f}秒)"})
-            yield sse("note", {"phase": "目录补偿", "text": "✅ Agent 分析完成!"})
+            yield sse_static("note", phase="目录补偿", text="✅ Agent 分析完成!")
             
             # 更新 format_framework
             format_framework = result["compensated_structure"]
@@ -226,15 +232,15 @@ async def run_framework_pipeline(model: str, language: str):
                 await mcp_smart_write(
                     mcp_client,
                     compensated_path,
-                    json.dumps(format_framework, ensure_ascii=False, indent=2)
+                    dump_artifact(compensated_path, format_framework)
                 )
             
-            yield sse("note", {"phase": "目录补偿", "text": "✅ 补偿后的结构已保存(已覆盖原文件)"})
-            yield sse("artifact", {"type": "file", "filename": settings.OUTPUT_PATHS["format_framework"]})
+            yield sse_static("note", phase="目录补偿", text="✅ 补偿后的结构已保存(已覆盖原文件)")
+            yield sse_static("artifact", type="file", filename=settings.OUTPUT_PATHS["format_framework"])
 
             
             # 阶段 1.9: 分类并生成三个视图
-            yield sse("note", {"phase": "目录补偿", "text": "📂 开始分类生成商务/技术/报价视图..."})
+            yield sse_static("note", phase="目录补偿", text="📂 开始分类生成商务/技术/报价视图...")
             
             try:
                 from .compensation.classifier import CatalogClassifier
@@ -255,14 +261,14 @@ async def run_framework_pipeline(model: str, language: str):
                         await mcp_smart_write(
                             mcp_client,
                             view_path,
-                            json.dumps(view_data, ensure_ascii=False, indent=2)
+                            dump_artifact(view_path, view_data)
                         )
                         
                         node_count = len(view_data)
-                        yield sse("artifact", {"type": "file", "filename": view_path})
+                        yield sse_static("artifact", type="file", filename=view_path)
                         yield sse("note", {"phase": "目录补偿", "text": f"✅ {view_type.upper()} 视图: {node_count} 个顶层节点"})
                 
-                yield sse("note", {"phase": "目录补偿", "text": "📂 三个分类视图已生成完毕"})
+                yield sse_static("note", phase="目录补偿", text="📂 三个分类视图已生成完毕")
                 
             except Exception as e:
                 import traceback
@@ -276,9 +282,9 @@ async def run_framework_pipeline(model: str, language: str):
             yield sse("warning", {"phase": "目录补偿", "text": f"补偿过程出错: {str(e)}"})
             yield sse("warning", {"phase": "目录补偿", "text": f"详细错误: {error_detail}"})
     else:
-        yield sse("warning", {"phase": "目录补偿", "text": "⚠️ 框架数据为空,跳过补偿流程"})
+        yield sse_static("warning", phase="目录补偿", text="⚠️ 框架数据为空,跳过补偿流程")
     
-    yield sse("phase_end", {"name": "目录补偿与分类"})
+    yield sse_static("phase_end", name="目录补偿与分类")
 
 class CatalogRequest(BaseModel):
     model: str
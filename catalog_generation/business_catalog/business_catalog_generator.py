@@ -13,13 +13,13 @@
 import json
 from typing import Dict, Any, List, AsyncGenerator, Tuple
 import re
-import uuid
+from secrets import token_hex
 import datetime
 
 from fastmcp import Client as MCPClient
 
 from ..config import settings
-from ..utils.mcp_utils import sse, mcp_read_file, mcp_smart_write, call_llm_streaming
+from ..utils.mcp_utils import sse, sse_static, mcp_read_file, mcp_smart_write, call_llm_streaming, consume_llm_stream
 from ..utils.file_utils import (
     extract_business_section,
     collect_leaf_nodes_with_path,
@@ -50,38 +50,38 @@ async def generate_business_catalog_v2_event_generator(
     mcp_client = MCPClient(settings.MCP_SERVER_URL)
     
     try:
-        yield sse("phase_start", {"name": "生成商务目录"})
+        yield sse_static("phase_start", name="生成商务目录")
         
         # 1. 读取 format_framework.json
         if format_framework is None:
             async with mcp_client:
                 framework_content = await mcp_read_file(mcp_client, settings.OUTPUT_PATHS["format_framework"])
             if not framework_content:
-                yield sse("error", {"message": "无法读取格式框架文件，请先执行格式框架提取"})
+                yield sse_static("error", message="无法读取格式框架文件，请先执行格式框架提取")
                 return
             try:
                 format_framework = json.loads(framework_content)
             except json.JSONDecodeError:
-                yield sse("error", {"message": "格式框架文件格式错误"})
+                yield sse_static("error", message="格式框架文件格式错误")
                 return
         
         business_framework = extract_business_section(format_framework)
         if not business_framework:
-            yield sse("warning", {"phase": "商务目录生成", "text": "未在格式框架中找到商务部分。"})
+            yield sse_static("warning", phase="商务目录生成", text="未在格式框架中找到商务部分。")
             return
         
         # ==============================================================================
         # 步骤1：逐项分析并生成子目录
         # ==============================================================================
-        yield sse("phase_start", {"name": "步骤1: 逐项分析并生成子目录"})
+        yield sse_static("phase_start", name="步骤1: 逐项分析并生成子目录")
         
         leaf_nodes = collect_leaf_nodes_with_path(business_framework)
         
         if not leaf_nodes:
-            yield sse("warning", {"phase": "商务目录生成", "text": "未找到叶子节点，跳过处理。"})
-            yield sse("phase_end", {"name": "步骤1: 逐项分析并生成子目录"})
-            yield sse("phase_end", {"name": "商务目录生成（重构版）"})
-            yield sse("complete", {"final_output": "商务目录生成完成（无需处理）"})
+            yield sse_static("warning", phase="商务目录生成", text="未找到叶子节点，跳过处理。")
+            yield sse_static("phase_end", name="步骤1: 逐项分析并生成子目录")
+            yield sse_static("phase_end", name="商务目录生成（重构版）")
+            yield sse_static("complete", final_output="商务目录生成完成（无需处理）")
             return
         
         yield sse("note", {"phase": "分析并生成", "text": f"识别到 {len(leaf_nodes)} 个叶子节点，开始逐项处理..."})
@@ -112,25 +112,19 @@ async def generate_business_catalog_v2_event_generator(
             
             md_analysis = ""
             try:
-                log_id = f"log-{uuid.uuid4()}"
+                log_id = f"log-{token_hex(8)}"
                 yield sse("debug_log", {"title": f"分析内容 ({idx}/{len(leaf_nodes)}): {node_name}", "log_id": log_id})
 
-                async for item in call_llm_streaming(
+                llm_stream = call_llm_streaming(
                     system_prompt=analysis_system_prompt,
                     user_input=analysis_input,
                     model_name=model_name,
                     yield_tokens=True
-                ):
-                    if 'event: token_delta' in item:
-                        try:
-                            data_line = next(line for line in item.split('\n') if line.startswith('data: '))
-                            data = json.loads(data_line[len('data: '):])
-                            delta = data.get('delta', '')
-                            if delta:
-                                md_analysis += delta
-                                yield sse("debug_token_delta", {"log_id": log_id, "delta": delta})
-                        except (StopIteration, json.JSONDecodeError):
-                            pass
+                )
+                stream_result = {}
+                async for frame in consume_llm_stream(llm_stream, log_id, stream_result):
+                    yield frame
+                md_analysis = stream_result["content"]
             except Exception as e:
                 yield sse("warning", {"phase": "分析并生成", "text": f"⚠️ ({idx}/{len(leaf_nodes)}) 分析失败: {node_name} - {str(e)}"})
                 continue
@@ -145,24 +139,18 @@ async def generate_business_catalog_v2_event_generator(
 
             children_response = ""
             try:
-                log_id = f"log-{uuid.uuid4()}"
+                log_id = f"log-{token_hex(8)}"
                 yield sse("debug_log", {"title": f"生成子目录 ({idx}/{len(leaf_nodes)}): {node_name}", "log_id": log_id})
-                async for item in call_llm_streaming(
+                llm_stream = call_llm_streaming(
                     system_prompt=children_system_prompt,
                     user_input=children_input,
                     model_name=model_name,
                     yield_tokens=True
-                ):
-                    if 'event: token_delta' in item:
-                        try:
-                            data_line = next(line for line in item.split('\n') if line.startswith('data: '))
-                            data = json.loads(data_line[len('data: '):])
-                            delta = data.get('delta', '')
-                            if delta:
-                                children_response += delta
-                                yield sse("debug_token_delta", {"log_id": log_id, "delta": delta})
-                        except (StopIteration, json.JSONDecodeError):
-                            pass
+                )
+                stream_result = {}
+                async for frame in consume_llm_stream(llm_stream, log_id, stream_result):
+                    yield frame
+                children_response = stream_result["content"]
             except Exception as e:
                 yield sse("warning", {"phase": "分析并生成", "text": f"⚠️ ({idx}/{len(leaf_nodes)}) 子目录生成失败: {node_name} - {str(e)}"})
                 continue
@@ -186,8 +174,8 @@ async def generate_business_catalog_v2_event_generator(
                 yield sse("warning", {"phase": "分析并生成", "text": f"⚠️ ({idx}/{len(leaf_nodes)}) JSON 解析失败: {node_name} - {str(e)}"})
                 continue
         
-        yield sse("note", {"phase": "分析并生成", "text": "所有叶子节点处理完成"})
-        yield sse("phase_end", {"name": "步骤1: 逐项分析并生成子目录"})
+        yield sse_static("note", phase="分析并生成", text="所有叶子节点处理完成")
+        yield sse_static("phase_end", name="步骤1: 逐项分析并生成子目录")
 
         # 保存步骤1结束后的中间文件
         intermediate_catalog_json = json.dumps(business_framework, ensure_ascii=False, indent=2)
@@ -197,7 +185,7 @@ async def generate_business_catalog_v2_event_generator(
                 settings.OUTPUT_PATHS["business_catalog_intermediate"],
                 intermediate_catalog_json
             )
-        yield sse("artifact", {"type": "file", "filename": settings.OUTPUT_PATHS["business_catalog_intermediate"]})
+        yield sse_static("artifact", type="file", filename=settings.OUTPUT_PATHS["business_catalog_intermediate"])
 
 
         # ==============================================================================
@@ -232,25 +220,19 @@ async def generate_business_catalog_v2_event_generator(
                             
                         try:
                             matching_analysis = ""
-                            log_id = f"log-{uuid.uuid4()}"
+                            log_id = f"log-{token_hex(8)}"
                             yield sse("debug_log", {"title": f"需求验证 ({idx}/{len(requirement_blocks)})", "log_id": log_id})
                             
-                            async for item in call_llm_streaming(
+                            llm_stream = call_llm_streaming(
                                 system_prompt=matching_system_prompt,
                                 user_input=verification_input,
                                 model_name=model_name,
                                 yield_tokens=True
-                            ):
-                                if 'event: token_delta' in item:
-                                    try:
-                                        data_line = next(line for line in item.split('\n') if line.startswith('data: '))
-                                        data = json.loads(data_line[len('data: '):])
-                                        delta = data.get('delta', '')
-                                        if delta:
-                                            matching_analysis += delta
-                                            yield sse("debug_token_delta", {"log_id": log_id, "delta": delta})
-                                    except (StopIteration, json.JSONDecodeError):
-                                        pass
+                            )
+                            stream_result = {}
+                            async for frame in consume_llm_stream(llm_stream, log_id, stream_result):
+                                yield frame
+                            matching_analysis = stream_result["content"]
             
                             if "IRRELEVANT_REQUIREMENT" in matching_analysis:
                                 yield sse("note", {"phase": "需求验证", "text": f"➡️ ({idx}/{len(requirement_blocks)}) 跳过无关需求"})
@@ -283,25 +265,19 @@ async def generate_business_catalog_v2_event_generator(
                             try:
                                 optimization_agent = directory_optimization_agent()
                                 optimization_response = ""
-                                log_id = f"log-{uuid.uuid4()}"
+                                log_id = f"log-{token_hex(8)}"
                                 yield sse("debug_log", {"title": f"目录优化 ({idx}/{len(requirement_blocks)})", "log_id": log_id})
 
-                                async for item in call_llm_streaming(
+                                llm_stream = call_llm_streaming(
                                     system_prompt=optimization_agent.instructions,
                                     user_input=optimization_input,
                                     model_name=model_name,
                                     yield_tokens=True
-                                ):
-                                    if 'event: token_delta' in item:
-                                        try:
-                                            data_line = next(line for line in item.split('\n') if line.startswith('data: '))
-                                            data = json.loads(data_line[len('data: '):])
-                                            delta = data.get('delta', '')
-                                            if delta:
-                                                optimization_response += delta
-                                                yield sse("debug_token_delta", {"log_id": log_id, "delta": delta})
-                                        except (StopIteration, json.JSONDecodeError):
-                                            pass
+                                )
+                                stream_result = {}
+                                async for frame in consume_llm_stream(llm_stream, log_id, stream_result):
+                                    yield frame
+                                optimization_response = stream_result["content"]
                                 
                                 tool_calls_executed, execution_logs = _parse_and_execute_tool_calls(
                                     optimization_response,
@@ -351,17 +327,17 @@ async def generate_business_catalog_v2_event_generator(
                             verification_report_full
                         )
                     
-                    yield sse("info", {"phase": "需求验证", "text": "📄 验证报告已保存: catalog_verification_report.md"})
-                    yield sse("note", {"phase": "需求验证", "text": "需求验证完成"})
+                    yield sse_static("info", phase="需求验证", text="📄 验证报告已保存: catalog_verification_report.md")
+                    yield sse_static("note", phase="需求验证", text="需求验证完成")
                 else:
-                    yield sse("note", {"phase": "需求验证", "text": "未找到需求块，跳过验证"})
+                    yield sse_static("note", phase="需求验证", text="未找到需求块，跳过验证")
             else:
-                yield sse("note", {"phase": "需求验证", "text": "未找到checklist文件，跳过验证"})
+                yield sse_static("note", phase="需求验证", text="未找到checklist文件，跳过验证")
                 
         except Exception as e:
             yield sse("warning", {"phase": "需求验证", "text": f"验证过程出错: {str(e)}"})
         
-        yield sse("phase_end", {"name": "步骤2: 需求验证与目录优化"})
+        yield sse_static("phase_end", name="步骤2: 需求验证与目录优化")
         
         def remove_analysis_report(nodes):
             for node in nodes:
@@ -383,13 +359,13 @@ async def generate_business_catalog_v2_event_generator(
                 final_catalog_json
             )
         
-        yield sse("artifact", {"type": "file", "filename": settings.OUTPUT_PATHS["business_catalog"]})
-        yield sse("phase_end", {"name": "生成商务目录"})
+        yield sse_static("artifact", type="file", filename=settings.OUTPUT_PATHS["business_catalog"])
+        yield sse_static("phase_end", name="生成商务目录")
 
         # ==============================================================================
         # 步骤4: 模板关联
         # ==============================================================================
-        yield sse("phase_start", {"name": "步骤4: 模板关联"})
+        yield sse_static("phase_start", name="步骤4: 模板关联")
         async for event in run_template_linking_pipeline(
             catalog_input_path=settings.OUTPUT_PATHS["business_catalog"],
             templates_input_path=settings.INPUT_PATHS["templates"],
@@ -397,7 +373,7 @@ async def generate_business_catalog_v2_event_generator(
             language=language
         ):
             yield event
-        yield sse("phase_end", {"name": "步骤4: 模板关联"})
+        yield sse_static("phase_end", name="步骤4: 模板关联")
 
         yield sse("complete", {"final_output": "商务目录及模板关联已全部完成！", "catalog": business_framework})
         
@@ -446,6 +422,9 @@ def _parse_and_execute_tool_calls(
         logs.append(f"📋 未在响应中解析到任何有效的工具调用: {response_text[:200]}")
         return 0, logs
 
+    # 同一批工具调用共享名称索引，避免每次增改都线性扫描同级节点
+    name_index = {}
+
     for tool_call in tool_calls_to_process:
         if not isinstance(tool_call, dict):
             continue
@@ -470,7 +449,7 @@ def _parse_and_execute_tool_calls(
                         node_data = {"name": child_name, "children": [], "content_description": ""}
 
                 if parent_path and node_data:
-                    if find_and_add_node(business_framework, parent_path, node_data):
+                    if find_and_add_node(business_framework, parent_path, node_data, name_index):
                         tool_calls_executed += 1
                         logs.append(f"✅ [ADD] 在 '{' > '.join(parent_path)}' 下添加 '{node_data.get('name')}'")
                     else:
@@ -487,7 +466,7 @@ def _parse_and_execute_tool_calls(
                 
                 if path and description:
                     update_data = {"content_description": description}
-                    if find_and_update_node(business_framework, path, update_data):
+                    if find_and_update_node(business_framework, path, update_data, name_index):
                         tool_calls_executed += 1
                         logs.append(f"✅ [UPDATE] 成功更新 '{' > '.join(path)}'")
                     else:
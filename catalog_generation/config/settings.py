@@ -29,6 +29,10 @@ _OUTPUT_DIR = os.path.join(_INPUT_BASE_DIR, "catalog_generation")
 # 确保输出目录存在
 os.makedirs(_OUTPUT_DIR, exist_ok=True)
 
+# 需要以缩进格式（indent=2）落盘、便于人工查看的 JSON 产物文件名，
+# 其余机器读取的中间产物一律输出紧凑 JSON。例如: {"business_framework.json"}
+PRETTY_JSON_ARTIFACTS = set()
+
 # 定义输入和输出文件的标准路径
 INPUT_PATHS = {
     "intermediate_chunks": os.path.join(_INPUT_BASE_DIR, "intermediate_chunks.json"),
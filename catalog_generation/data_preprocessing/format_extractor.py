@@ -13,14 +13,14 @@
 import json
 import re
 import traceback
-import uuid
+from secrets import token_hex
 from typing import Dict, Any, List, AsyncGenerator
 
 from agents import Agent
 from fastmcp import Client as MCPClient
 
 from ..config import settings
-from ..utils.mcp_utils import sse, mcp_read_file, mcp_smart_write, call_llm_streaming
+from ..utils.mcp_utils import sse, sse_static, mcp_read_file, mcp_smart_write, call_llm_streaming, consume_llm_stream
 from ..utils.file_utils import (
     build_nested_catalog,
     extract_leaf_nodes,
@@ -129,6 +129,29 @@ def catalog_description_enrichment_agent(language: str = "zh") -> Agent:
 # Core Logic
 # ==============================================================================
 
+def _parse_chunks(chunks_content: str) -> List[Dict[str, Any]]:
+    """
+    解析分块文件。当前格式为 NDJSON（每行一个分块对象），
+    同时兼容旧版的 JSON 数组格式（首个非空字符为 "["）。
+    """
+    if chunks_content.lstrip().startswith("["):
+        chunks = json.loads(chunks_content)
+        if not isinstance(chunks, list):
+            raise json.JSONDecodeError("文件内容不是一个列表", chunks_content, 0)
+        return chunks
+
+    chunks = []
+    # orjson 会转义字符串中的换行符，但不转义 U+2028 等字符，因此只按 "\n" 切分而不用 splitlines()
+    for line in chunks_content.split("\n"):
+        if not line.strip():
+            continue
+        chunk = json.loads(line)
+        if not isinstance(chunk, dict):
+            raise json.JSONDecodeError("分块行不是一个对象", line, 0)
+        chunks.append(chunk)
+    return chunks
+
+
 async def extract_format_framework_event_generator(
     intermediate_chunks_path: str = settings.INPUT_PATHS["intermediate_chunks"],
     model_name: str = settings.DEFAULT_MODEL_NAME,
@@ -141,7 +164,7 @@ async def extract_format_framework_event_generator(
     mcp_client = MCPClient(settings.MCP_SERVER_URL)
     
     try:
-        yield sse("phase_start", {"name": "提取格式框架"})
+        yield sse_static("phase_start", name="提取格式框架")
         
         async with mcp_client:
             chunks_content = await mcp_read_file(mcp_client, intermediate_chunks_path)
@@ -151,9 +174,7 @@ async def extract_format_framework_event_generator(
             return
             
         try:
-            chunks = json.loads(chunks_content)
-            if not isinstance(chunks, list):
-                raise json.JSONDecodeError("文件内容不是一个列表", chunks_content, 0)
+            chunks = _parse_chunks(chunks_content)
         except json.JSONDecodeError:
             yield sse("error", {"message": f"解析分块文件失败: {intermediate_chunks_path}"})
             return
@@ -176,7 +197,7 @@ async def extract_format_framework_event_generator(
                 system_prompt = format_agent.instructions
                 user_input = f"请从以下文本中提取投标文件格式要求：\n\n---\n\n{chunk_text}"
                 
-                log_id = f"log-{uuid.uuid4()}"
+                log_id = f"log-{token_hex(8)}"
                 yield sse("debug_log", {"title": f"BidFormatExtractorAgent Output (块 {i+1}/{len(chunks)})", "log_id": log_id})
 
                 result_stream_generator = call_llm_streaming(
@@ -186,18 +207,10 @@ async def extract_format_framework_event_generator(
                     yield_tokens=True
                 )
                 
-                full_response = ""
-                async for event in result_stream_generator:
-                    if 'event: token_delta' in event:
-                        try:
-                            data_line = next(line for line in event.split('\n') if line.startswith('data: '))
-                            data = json.loads(data_line[len('data: '):])
-                            delta = data.get('delta', '')
-                            if delta:
-                                full_response += delta
-                                yield sse("debug_token_delta", {"log_id": log_id, "delta": delta})
-                        except (StopIteration, json.JSONDecodeError):
-                            pass
+                stream_result = {}
+                async for frame in consume_llm_stream(result_stream_generator, log_id, stream_result):
+                    yield frame
+                full_response = stream_result["content"]
 
             except Exception as e:
                 yield sse("warning", {"phase": "提取格式框架", "text": f"处理块 {i+1} 时LLM调用失败: {str(e)}"})
@@ -216,7 +229,7 @@ async def extract_format_framework_event_generator(
                 continue
         
         if not format_framework_flat:
-             yield sse("warning", {"phase": "提取格式框架", "text": "未能在任何文本块中找到有效的目录框架。"})
+             yield sse_static("warning", phase="提取格式框架", text="未能在任何文本块中找到有效的目录框架。")
 
         format_framework = build_nested_catalog(format_framework_flat)
         
@@ -227,9 +240,9 @@ async def extract_format_framework_event_generator(
                 json.dumps(format_framework, ensure_ascii=False, indent=2)
             )
         
-        yield sse("artifact", {"type": "file", "filename": settings.OUTPUT_PATHS["format_framework"]})
+        yield sse_static("artifact", type="file", filename=settings.OUTPUT_PATHS["format_framework"])
         yield sse("note", {"phase": "提取格式框架", "text": f"格式框架提取完成，共识别 {len(format_framework)} 个顶级部分。"})
-        yield sse("phase_end", {"name": "提取格式框架"})
+        yield sse_static("phase_end", name="提取格式框架")
         
         complete_data = {
             "final_output": "格式框架提取完成！",
@@ -259,13 +272,13 @@ async def enrich_catalog_descriptions_event_generator(
     阶段2：为格式框架中的叶子节点添加内容描述。
     """
     try:
-        yield sse("phase_start", {"name": "添加目录内容描述"})
+        yield sse_static("phase_start", name="添加目录内容描述")
         
         leaf_nodes = extract_leaf_nodes(format_framework)
         
         if not leaf_nodes:
-            yield sse("warning", {"phase": "添加目录内容描述", "text": "未找到叶子节点，跳过描述添加。"})
-            yield sse("phase_end", {"name": "添加目录内容描述"})
+            yield sse_static("warning", phase="添加目录内容描述", text="未找到叶子节点，跳过描述添加。")
+            yield sse_static("phase_end", name="添加目录内容描述")
             return
         
         yield sse("note", {"phase": "添加目录内容描述", "text": f"识别到 {len(leaf_nodes)} 个叶子节点，将分 {(len(leaf_nodes) + batch_size - 1) // batch_size} 批处理"})
@@ -310,7 +323,7 @@ async def enrich_catalog_descriptions_event_generator(
             try:
                 system_prompt = description_agent.instructions
                 
-                log_id = f"log-{uuid.uuid4()}"
+                log_id = f"log-{token_hex(8)}"
                 yield sse("debug_log", {"title": f"CatalogDescriptionEnrichmentAgent Output (批次 {batch_num}/{total_batches})", "log_id": log_id})
 
                 result_stream_generator = call_llm_streaming(
@@ -320,18 +333,10 @@ async def enrich_catalog_descriptions_event_generator(
                     yield_tokens=True
                 )
                 
-                response_text = ""
-                async for event in result_stream_generator:
-                    if 'event: token_delta' in event:
-                        try:
-                            data_line = next(line for line in event.split('\n') if line.startswith('data: '))
-                            data = json.loads(data_line[len('data: '):])
-                            delta = data.get('delta', '')
-                            if delta:
-                                response_text += delta
-                                yield sse("debug_token_delta", {"log_id": log_id, "delta": delta})
-                        except (StopIteration, json.JSONDecodeError):
-                            pass
+                stream_result = {}
+                async for frame in consume_llm_stream(result_stream_generator, log_id, stream_result):
+                    yield frame
+                response_text = stream_result["content"]
 
             except Exception as e:
                 yield sse("warning", {"phase": "添加目录内容描述", "text": f"批次 {batch_num} 处理失败: {str(e)}"})
@@ -360,7 +365,7 @@ async def enrich_catalog_descriptions_event_generator(
                 yield sse("warning", {"phase": "添加目录内容描述", "text": f"批次 {batch_num} 解析失败: {str(e)}"})
                 continue
         
-        yield sse("note", {"phase": "添加目录内容描述", "text": "所有节点处理完毕，目录内容描述添加完成。"})
+        yield sse_static("note", phase="添加目录内容描述", text="所有节点处理完毕，目录内容描述添加完成。")
         
         mcp_client = MCPClient(settings.MCP_SERVER_URL)
         json_content = json.dumps(format_framework, ensure_ascii=False, indent=2)
@@ -372,9 +377,9 @@ async def enrich_catalog_descriptions_event_generator(
                 json_content
             )
         
-        yield sse("artifact", {"type": "file", "filename": settings.OUTPUT_PATHS["format_framework"]})
+        yield sse_static("artifact", type="file", filename=settings.OUTPUT_PATHS["format_framework"])
         yield sse("note", {"phase": "添加目录内容描述", "text": f"已更新 {settings.OUTPUT_PATHS['format_framework']} 文件。"})
-        yield sse("phase_end", {"name": "添加目录内容描述"})
+        yield sse_static("phase_end", name="添加目录内容描述")
         
     except Exception as e:
         tb_str = traceback.format_exc()
@@ -1,13 +1,13 @@
 # -*- coding: utf-8 -*-
 import json
 import copy
-import uuid
+from secrets import token_hex
 from typing import Dict, Any, List, AsyncGenerator
 
 from fastmcp import Client as MCPClient
 
 from ..config import settings
-from ..utils.mcp_utils import sse, mcp_read_file, mcp_smart_write, call_llm_streaming
+from ..utils.mcp_utils import sse, sse_static, mcp_read_file, mcp_smart_write, call_llm_streaming
 from .agents import template_linking_agent
 
 def create_templates_markdown(templates_data: List[Dict]) -> str:
@@ -45,7 +45,7 @@ async def _find_and_update_leaf_nodes(
 """
             
             response_text = ""
-            log_id = f"log-{uuid.uuid4()}"
+            log_id = f"log-{token_hex(8)}"
             yield sse("debug_log", {"title": f"匹配模板: {node.get('name')}", "log_id": log_id})
 
             async for event in call_llm_streaming(
@@ -109,7 +109,7 @@ async def run_template_linking_pipeline(
         templates_data = json.loads(templates_content)
         catalog_data = json.loads(catalog_content)
         
-        yield sse("note", {"phase": "模板关联", "text": "已成功加载模板和目录数据。"})
+        yield sse_static("note", phase="模板关联", text="已成功加载模板和目录数据。")
 
         catalog_data_copy = copy.deepcopy(catalog_data)
         available_templates = list(templates_data)
@@ -124,7 +124,7 @@ async def run_template_linking_pipeline(
                 json.dumps(catalog_data_copy, ensure_ascii=False, indent=2)
             )
         
-        yield sse("artifact", {"type": "file", "filename": catalog_output_path})
+        yield sse_static("artifact", type="file", filename=catalog_output_path)
 
     except Exception as e:
         yield sse("error", {"type": type(e).__name__, "message": str(e)})
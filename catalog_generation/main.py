@@ -19,7 +19,7 @@ from .data_preprocessing.format_extractor import (
     enrich_catalog_descriptions_event_generator,
 )
 from .compensation.orchestrator import CompensationOrchestrator
-from .utils.mcp_utils import sse
+from .utils.mcp_utils import sse, sse_static
 from .business_catalog.business_catalog_generator import generate_business_catalog_v2_event_generator
 from .technical_catalog.technical_catalog_generator import generate_technical_catalog_event_generator
 
@@ -68,7 +68,7 @@ async def event_generator(
             yield event
     
     # 阶段1.8：目录补偿（新增）
-    yield sse("phase_start", {"name": "目录补偿与分类"})
+    yield sse_static("phase_start", name="目录补偿与分类")
     
     if format_framework:
         try:
@@ -96,12 +96,12 @@ async def event_generator(
             with open(compensated_path, 'w', encoding='utf-8') as f:
                 json.dump(format_framework, f, ensure_ascii=False, indent=2)
             
-            yield sse("artifact", {"type": "file", "filename": compensated_path})
+            yield sse_static("artifact", type="file", filename=compensated_path)
             
         except Exception as e:
             yield sse("warning", {"phase": "目录补偿", "text": f"补偿过程出错: {str(e)}"})
     
-    yield sse("phase_end", {"name": "目录补偿与分类"})
+    yield sse_static("phase_end", name="目录补偿与分类")
     
     # 阶段2：生成商务目录
     async for event in generate_business_catalog_v2_event_generator(
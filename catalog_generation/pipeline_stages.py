@@ -6,22 +6,43 @@ PIPELINE STAGES
 ============================================================
 """
 
+import asyncio
 import json
 import os
 import time
-import uuid
+from secrets import token_hex
 from typing import Any, AsyncGenerator
-from fastmcp import Client as MCPClient
+import orjson
 
 from .pipeline_core import PipelineStage, StageResult
 from .utils.mcp_utils import sse, mcp_read_file, mcp_smart_write
+from .utils.file_utils import dump_json, dump_artifact
 from .config import settings
-from .data_preprocessing.format_extractor import (
-    extract_format_framework_event_generator,
-    enrich_catalog_descriptions_event_generator
-)
-from .compensation.orchestrator import CompensationOrchestrator
-from .compensation.classifier import CatalogClassifier
+
+
+def _file_matches(file_path: str, content: bytes) -> bool:
+    """判断磁盘上的文件是否已存在且内容与待写入内容一致。"""
+    try:
+        with open(file_path, "rb") as f:
+            return f.read() == content
+    except OSError:
+        return False
+
+
+async def _read_existing_views(mcp_client, view_paths: dict) -> dict | None:
+    """通过 MCP 读取已落盘的分类视图，任一缺失或无法解析时返回 None。"""
+    contents = await asyncio.gather(*[
+        mcp_read_file(mcp_client, path) for path in view_paths.values()
+    ])
+    views = {}
+    for view_type, content in zip(view_paths, contents):
+        if content is None:
+            return None
+        try:
+            views[view_type] = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            return None
+    return views
 
 
 class FrameworkExtractionStage(PipelineStage):
@@ -33,6 +54,9 @@ class FrameworkExtractionStage(PipelineStage):
         self.language = language
     
     async def _run(self, input_data: Any) -> AsyncGenerator:
+        # 按需导入，避免只跑部分阶段时加载整条流水线的依赖
+        from .data_preprocessing.format_extractor import extract_format_framework_event_generator
+        
         format_framework = None
         source_chunk = None
         
@@ -86,6 +110,7 @@ class DescriptionEnrichmentStage(PipelineStage):
             return
         
         # 调用原有的丰富描述逻辑
+        from .data_preprocessing.format_extractor import enrich_catalog_descriptions_event_generator
         gen = enrich_catalog_descriptions_event_generator(
             format_framework=framework,
             source_chunk_text=source_chunk,
@@ -131,6 +156,10 @@ class CompensationStage(PipelineStage):
             yield StageResult(data=input_data)
             return
         
+        from fastmcp import Client as MCPClient
+        from .compensation.orchestrator import CompensationOrchestrator
+        from .compensation.classifier import CatalogClassifier
+        
         yield self.note(f"开始分析和补偿目录结构,共 {len(framework)} 个顶层节点")
         yield self.note("🤖 ReAct Agent 正在分析目录结构...")
         yield self.note("⏳ 这可能需要 30-60 秒,请耐心等待...")
@@ -140,7 +169,7 @@ class CompensationStage(PipelineStage):
         os.makedirs(log_dir, exist_ok=True)
         log_file = os.path.join(log_dir, "compensation_log.txt")
         
-        log_id = f"log-{uuid.uuid4()}"
+        log_id = f"log-{token_hex(8)}"
         agent_logs = []
         
         yield sse("debug_log", {"title": "ReAct Agent 推理过程", "log_id": log_id})
@@ -174,43 +203,47 @@ class CompensationStage(PipelineStage):
         yield self.note(f"补偿完成,来源: {result['source']}")
         yield self.note(f"最终结构: {len(compensated_framework)} 个顶层节点")
         
-        # 保存补偿后的结构
+        # 保存补偿后的结构及三个分类视图
         compensated_path = os.path.join(settings._OUTPUT_DIR, "format_framework_compensated.json")
         
-        async with MCPClient(settings.MCP_SERVER_URL) as mcp_client:
-            await mcp_smart_write(
-                mcp_client,
-                compensated_path,
-                json.dumps(compensated_framework, ensure_ascii=False, indent=2)
-            )
-        
-        yield self.artifact(compensated_path)
-        yield self.note("✅ 补偿后的结构已保存")
-        
-        # 分类生成三个视图
-        yield self.note("📂 开始分类生成商务/技术/报价视图...")
-        
-        classifier = CatalogClassifier()
-        views = classifier.classify_and_split(compensated_framework)
-        
         view_paths = {
             "business": os.path.join(settings._OUTPUT_DIR, "business_framework.json"),
             "technical": os.path.join(settings._OUTPUT_DIR, "technical_framework.json"),
             "pricing": os.path.join(settings._OUTPUT_DIR, "pricing_framework.json")
         }
         
+        # 先统一序列化全部产物，MCP 连接内只做读取比对和并发写入
+        payloads = {compensated_path: dump_artifact(compensated_path, compensated_framework)}
+        
         async with MCPClient(settings.MCP_SERVER_URL) as mcp_client:
-            for view_type, view_data in views.items():
-                view_path = view_paths[view_type]
-                await mcp_smart_write(
-                    mcp_client,
-                    view_path,
-                    json.dumps(view_data, ensure_ascii=False, indent=2)
-                )
+            # 补偿结构与上次落盘的一致时，直接复用已有视图，跳过分类遍历
+            views = None
+            if _file_matches(compensated_path, payloads[compensated_path]):
+                views = await _read_existing_views(mcp_client, view_paths)
+            
+            if views is not None:
+                yield self.note("♻️ 补偿结构未变化,复用已有的商务/技术/报价视图")
+            else:
+                yield self.note("📂 开始分类生成商务/技术/报价视图...")
                 
-                node_count = len(view_data)
-                yield self.artifact(view_path)
-                yield self.note(f"✅ {view_type.upper()} 视图: {node_count} 个顶层节点")
+                classifier = CatalogClassifier()
+                views = classifier.classify_and_split(compensated_framework)
+                
+                for view_type, view_data in views.items():
+                    payloads[view_paths[view_type]] = dump_artifact(view_paths[view_type], view_data)
+            
+            pending = [path for path, content in payloads.items() if not _file_matches(path, content)]
+            if pending:
+                await asyncio.gather(*[
+                    mcp_smart_write(mcp_client, path, payloads[path]) for path in pending
+                ])
+        
+        yield self.artifact(compensated_path)
+        yield self.note("✅ 补偿后的结构已保存")
+        
+        for view_type, view_data in views.items():
+            yield self.artifact(view_paths[view_type])
+            yield self.note(f"✅ {view_type.upper()} 视图: {len(view_data)} 个顶层节点")
         
         yield self.note("📂 三个分类视图已生成完毕")
         
@@ -5,14 +5,14 @@ from typing import AsyncGenerator, List, Dict
 from fastmcp import Client as MCPClient
 from ..config import settings
 from ..linking.linker import run_template_linking_pipeline
-from ..utils.mcp_utils import sse, mcp_read_file, mcp_smart_write
-from ..utils.file_utils import extract_section_as_json
+from ..utils.mcp_utils import sse, sse_static, mcp_read_file, mcp_smart_write
+from ..utils.file_utils import extract_section_as_json, dump_artifact
 
 async def generate_pricing_catalog_event_generator(language: str = "zh") -> AsyncGenerator[str, None]:
     """
     生成报价目录并关联模板。
     """
-    yield sse("phase_start", {"name": "生成报价目录"})
+    yield sse_static("phase_start", name="生成报价目录")
 
     # 1. 从 format_framework.json 中提取报价部分
     pricing_section = []
@@ -26,7 +26,7 @@ async def generate_pricing_catalog_event_generator(language: str = "zh") -> Asyn
             pricing_section = extract_section_as_json(full_framework, "价格") or extract_section_as_json(full_framework, "报价")
         
         if not pricing_section:
-            yield sse("warning", {"phase": "生成报价目录", "text": "未在格式框架中找到报价/价格部分。"})
+            yield sse_static("warning", phase="生成报价目录", text="未在格式框架中找到报价/价格部分。")
             return
 
     except Exception as e:
@@ -40,7 +40,7 @@ async def generate_pricing_catalog_event_generator(language: str = "zh") -> Asyn
             await mcp_smart_write(
                 mcp_client,
                 temp_pricing_catalog_path,
-                json.dumps(pricing_section, ensure_ascii=False, indent=2)
+                dump_artifact(temp_pricing_catalog_path, pricing_section)
             )
     except Exception as e:
         yield sse("error", {"message": f"创建临时报价目录文件失败: {e}"})
@@ -62,5 +62,5 @@ async def generate_pricing_catalog_event_generator(language: str = "zh") -> Asyn
     except Exception:
         pass # 清理失败不影响主流程
 
-    yield sse("phase_end", {"name": "生成报价目录"})
-    yield sse("complete", {"final_output": "报价目录模板关联完成！"})
+    yield sse_static("phase_end", name="生成报价目录")
+    yield sse_static("complete", final_output="报价目录模板关联完成！")
@@ -10,18 +10,68 @@
 # Input: Markdown content, JSON data, etc.
 # Output: Processed data structures (JSON, lists, etc.).
 
+import os
 import re
+from functools import lru_cache
 from typing import Dict, Any, List
 
+import orjson
+
+from ..config import settings
+
+# 预编译的静态正则
+_REQ_BLOCK_RE = re.compile(r'^-[^\S\n]*\[[^\S\n]*\][^\S\n]+')
+_REQ_BLOCK_SPLIT_RE = re.compile(r'(?m)(?=^-[^\S\n]*\[[^\S\n]*\][^\S\n]+)')
+_H1_LINE_RE = re.compile(r'(?m)^#(?!#)')
+
+
+@lru_cache(maxsize=256)
+def _section_re(section_name: str) -> re.Pattern:
+    """按部分名称缓存：匹配从该标题开始到下一个一级标题之前的内容。"""
+    return re.compile(rf'#\s*{re.escape(section_name)}.*?(?=\n#\s|\Z)', re.DOTALL | re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def _section_alt_re(section_name: str) -> re.Pattern:
+    """按部分名称缓存：兼容 example.md 中 "- 第X卷" 形式的列表标题。"""
+    return re.compile(rf'-\s*{re.escape(section_name)}.*?(?=\n-\s*第|\Z)', re.DOTALL | re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def _node_name_re(node_name: str) -> re.Pattern:
+    """按目录名称缓存：直接匹配或带编号匹配（如 "5.1 投标人基本情况表"）。"""
+    escaped = re.escape(node_name)
+    return re.compile(rf'({escaped})|(\d+\.\d*[^\S\n]*{escaped})', re.IGNORECASE)
+
+
+def dump_json(obj: Any) -> bytes:
+    """使用 orjson 将对象序列化为 2 空格缩进的 JSON（UTF-8 字节串，不转义中文）。"""
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+
+
+def dump_artifact(path: str, obj: Any) -> bytes:
+    """
+    序列化要落盘的 JSON 产物。
+    文件名在 settings.PRETTY_JSON_ARTIFACTS 中时输出缩进格式，否则输出紧凑 JSON。
+    """
+    if os.path.basename(path) in settings.PRETTY_JSON_ARTIFACTS:
+        return dump_json(obj)
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
 
 def extract_json_from_response(response_text: str) -> str:
     """从 LLM 的响应文本中提取 JSON 字符串。"""
     # 查找被 ```json ... ``` 包围的代码块
-    match = re.search(r"```json\s*([\s\S]*?)\s*```", response_text)
-    if match:
-        return match.group(1).strip()
-    # 如果没有找到代码块，直接返回原始文本，让后续的 json.loads 尝试解析
-    return response_text
+    start = response_text.find("```json")
+    if start < 0:
+        # 如果没有找到代码块，直接返回原始文本，让后续的 json.loads 尝试解析
+        return response_text.strip()
+    start += len("```json")
+    end = response_text.find("```", start)
+    if end < 0:
+        # 代码块未闭合（如输出被截断），取其后的全部内容
+        return response_text[start:].strip()
+    return response_text[start:end].strip()
 
 
 def extract_section(markdown_content: str, section_name: str) -> str:
@@ -35,15 +85,13 @@ def extract_section(markdown_content: str, section_name: str) -> str:
     Returns:
         只包含指定部分的文本。
     """
-    # 构建正则表达式，匹配从指定标题开始，到下一个一级标题之前的所有内容
-    pattern = re.compile(rf'#\s*{section_name}.*?(?=\n#\s|\Z)', re.DOTALL | re.IGNORECASE)
-    match = pattern.search(markdown_content)
+    # 匹配从指定标题开始，到下一个一级标题之前的所有内容
+    match = _section_re(section_name).search(markdown_content)
     if match:
         return match.group(0).strip()
     
     # 兼容 example.md 中的格式
-    pattern_alt = re.compile(rf'-\s*{section_name}.*?(?=\n-\s*第|\Z)', re.DOTALL | re.IGNORECASE)
-    match_alt = pattern_alt.search(markdown_content)
+    match_alt = _section_alt_re(section_name).search(markdown_content)
     if match_alt:
         return match_alt.group(0).strip()
         
@@ -63,142 +111,162 @@ def parse_requirement_blocks(checklist_content: str) -> List[str]:
         需求块的列表，每个元素是一个完整的需求块字符串。
     """
     blocks = []
-    lines = checklist_content.split('\n')
-    current_block = []
-    in_block = False
-    
-    for line in lines:
-        # 检测需求块的开始（一级需求：- [ ] 开头，顶格或缩进很少）
-        if re.match(r'^-\s*\[\s*\]\s+', line):
-            # 如果之前有正在构建的块，保存它
-            if current_block:
-                blocks.append('\n'.join(current_block))
-            # 开始新块
-            current_block = [line]
-            in_block = True
-        elif in_block:
-            # 继续收集当前块的内容
-            # 如果是空行且下一行是新的一级需求，则结束当前块
-            if line.strip() == '':
-                # 检查是否是块之间的分隔
-                current_block.append(line)
-            elif line.startswith('#') and not line.startswith('##'):
-                # 遇到新的一级标题，结束当前块
-                if current_block:
-                    blocks.append('\n'.join(current_block))
-                current_block = []
-                in_block = False
-            else:
-                # 普通行（子项、描述等）
-                current_block.append(line)
-    
-    # 保存最后一个块
-    if current_block:
-        blocks.append('\n'.join(current_block))
-    
-    # 过滤掉空块
-    blocks = [b.strip() for b in blocks if b.strip()]
+    # 在每个一级需求（- [ ] 开头）处切分，切分前的内容不属于任何需求块
+    for piece in _REQ_BLOCK_SPLIT_RE.split(checklist_content):
+        if not _REQ_BLOCK_RE.match(piece):
+            continue
+        # 遇到新的一级标题，当前块到此结束
+        heading = _H1_LINE_RE.search(piece)
+        if heading:
+            piece = piece[:heading.start()]
+        piece = piece.strip()
+        if piece:
+            blocks.append(piece)
     
     return blocks
 
 
-def find_and_update_node(catalog: List[Dict], path: List[str], update_data: Dict) -> bool:
-    """递归查找并更新节点，支持根路径模糊匹配。"""
-    if not path:
-        return False
-        
-    # --- 新增：根路径模糊匹配 ---
+def _name_index(nodes: List[Dict], index: Dict | None) -> Dict[str, List[Dict]]:
+    """
+    返回同级节点的 名称→节点列表 索引（同名节点按原顺序排列）。
+    
+    index 为调用方持有的缓存（键为 id(节点列表)），可在同一批次的多次增改之间复用；
+    列表被替换或长度变化时自动重建。index 为 None 时临时构建。
+    """
+    if index is not None:
+        cached = index.get(id(nodes))
+        if cached is not None and cached[0] is nodes and cached[2] == len(nodes):
+            return cached[1]
+    
+    by_name = {}
+    for node in nodes:
+        by_name.setdefault(node.get("name"), []).append(node)
+    if index is not None:
+        index[id(nodes)] = (nodes, by_name, len(nodes))
+    return by_name
+
+
+def _append_node(nodes: List[Dict], node: Dict, index: Dict | None) -> None:
+    """向同级节点列表追加节点，并同步更新已缓存的名称索引。"""
+    nodes.append(node)
+    if index is not None:
+        cached = index.get(id(nodes))
+        if cached is not None and cached[0] is nodes:
+            cached[1].setdefault(node.get("name"), []).append(node)
+            index[id(nodes)] = (nodes, cached[1], len(nodes))
+
+
+def _complete_root_path(catalog: List[Dict], path: List[str], index: Dict | None = None) -> None:
+    """
+    根路径模糊匹配：如果目录只有一个根节点，且路径的第一个部分在根节点下能找到，
+    则在路径开头补全根节点名称（原地修改 path）。
+    """
     if (len(catalog) == 1 and 
         catalog[0].get("name") and 
         path[0] != catalog[0].get("name")):
         
-        child_names = [child.get("name") for child in catalog[0].get("children", [])]
-        if path[0] in child_names:
+        children = catalog[0].get("children")
+        if children and path[0] in _name_index(children, index):
             path.insert(0, catalog[0]["name"])
-    # --- 结束 ---
+
+
+def find_and_update_node(catalog: List[Dict], path: List[str], update_data: Dict, index: Dict | None = None) -> bool:
+    """
+    按路径查找并更新节点（显式栈深度优先，同名节点可回溯），支持根路径模糊匹配。
+    
+    index 为可选的名称索引缓存，批量增改同一目录时传入同一个 dict 以复用。
+    """
+    if not path:
+        return False
+    
+    # 栈中保存 (当前层节点列表, 剩余路径)，按原递归顺序逆序压栈
+    stack = [(catalog, path)]
+    while stack:
+        nodes, current_path = stack.pop()
+        if not current_path:
+            continue
+        _complete_root_path(nodes, current_path, index)
+        
+        target_name = current_path[0]
+        remaining_path = current_path[1:]
+        matches = _name_index(nodes, index).get(target_name, [])
+        
+        if not remaining_path:
+            if not matches:
+                continue
+            item = matches[0]
+            # --- 核心改动：采用更智能的"追加式"描述更新 ---
+            if 'content_description' in update_data:
+                new_desc = update_data.pop('content_description', '')
+                if 'content_description' in item and item['content_description']:
+                    # 如果已有描述，则将新描述作为补充内容追加
+                    item['content_description'] += f"\n\n---\n# 补充要求\n{new_desc}"
+                else:
+                    # 如果没有描述，则直接设置
+                    item['content_description'] = new_desc
             
-    target_name = path[0]
-    remaining_path = path[1:]
-    
-    for item in catalog:
-        if item.get("name") == target_name:
-            if not remaining_path:
-                # --- 核心改动：采用更智能的"追加式"描述更新 ---
-                if 'content_description' in update_data:
-                    new_desc = update_data.pop('content_description', '')
-                    if 'content_description' in item and item['content_description']:
-                        # 如果已有描述，则将新描述作为补充内容追加
-                        item['content_description'] += f"\n\n---\n# 补充要求\n{new_desc}"
-                    else:
-                        # 如果没有描述，则直接设置
-                        item['content_description'] = new_desc
-                
-                # 更新其他可能的字段（例如 children）
-                item.update(update_data)
-                return True
-            else:
-                # 继续在子节点中查找
-                if "children" in item:
-                    if find_and_update_node(item["children"], remaining_path, update_data):
-                        return True
+            # 更新其他可能的字段（例如 children）
+            item.update(update_data)
+            if index is not None and ("name" in update_data or "children" in update_data):
+                # 名称或子节点被替换，已缓存的索引失效
+                index.clear()
+            return True
+        
+        # 继续在子节点中查找
+        for item in reversed(matches):
+            if "children" in item:
+                stack.append((item["children"], list(remaining_path)))
     return False
 
 
-def find_and_add_node(catalog: List[Dict], parent_path: List[str], node_data: Dict) -> bool:
+def find_and_add_node(catalog: List[Dict], parent_path: List[str], node_data: Dict, index: Dict | None = None) -> bool:
     """
-    递归查找父节点并添加子节点。
+    查找父节点并添加子节点。
     支持根路径模糊匹配和中间路径自动创建。
+    
+    index 为可选的名称索引缓存，批量增改同一目录时传入同一个 dict 以复用。
     """
     if not parent_path:
-        catalog.append(node_data)
+        _append_node(catalog, node_data, index)
         return True
 
     if not isinstance(node_data, dict):
         return False
 
-    # --- 新增：根路径模糊匹配 ---
-    # 如果目录只有一个根节点，且路径的第一个部分在根节点下能找到，则自动补全根路径
-    if (len(catalog) == 1 and 
-        catalog[0].get("name") and 
-        parent_path[0] != catalog[0].get("name")):
-        
-        child_names = [child.get("name") for child in catalog[0].get("children", [])]
-        if parent_path[0] in child_names:
-            parent_path.insert(0, catalog[0]["name"])
-    # --- 结束 ---
+    # 根路径模糊匹配：如果目录只有一个根节点，且路径的第一个部分在根节点下能找到，则自动补全根路径
+    _complete_root_path(catalog, parent_path, index)
 
     current_level_nodes = catalog
     
     # 遍历路径，查找或创建父节点
-    for i, part in enumerate(parent_path):
-        found_node = None
-        for node in current_level_nodes:
-            if node.get("name") == part:
-                found_node = node
-                break
+    for part in parent_path:
+        found_nodes = _name_index(current_level_nodes, index).get(part)
         
-        if found_node:
+        if found_nodes:
             # 如果找到了节点，则进入下一层 children
-            current_level_nodes = found_node.setdefault("children", [])
+            current_level_nodes = found_nodes[0].setdefault("children", [])
         else:
             # 如果没找到，创建新的父节点
             new_parent = {"name": part, "children": []}
-            current_level_nodes.append(new_parent)
+            _append_node(current_level_nodes, new_parent, index)
             current_level_nodes = new_parent["children"]
             
     # 在最终找到或创建的父节点的 children 中添加新节点
-    current_level_nodes.append(node_data)
+    _append_node(current_level_nodes, node_data, index)
     return True
 
 
 def assign_ids_and_levels(catalog: List[Dict], level: int = 1, prefix: str = "cat") -> None:
-    """递归地为目录分配ID和层级"""
-    for i, item in enumerate(catalog, 1):
-        item_id = f"{prefix}_{i:03d}"
-        item["id"] = item_id
-        item["level"] = level
-        if "children" in item and item["children"]:
-            assign_ids_and_levels(item["children"], level + 1, item_id)
+    """为目录分配ID和层级（显式栈遍历）"""
+    stack = [(catalog, level, prefix)]
+    while stack:
+        items, current_level, current_prefix = stack.pop()
+        for i, item in enumerate(items, 1):
+            item_id = f"{current_prefix}_{i:03d}"
+            item["id"] = item_id
+            item["level"] = current_level
+            if "children" in item and item["children"]:
+                stack.append((item["children"], current_level + 1, item_id))
 
 
 def build_nested_catalog(flat_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -209,8 +277,8 @@ def build_nested_catalog(flat_list: List[Dict[str, Any]]) -> List[Dict[str, Any]
         return []
 
     nested_catalog = []
-    # 栈，用于追踪各层级的父节点。键是层级，值是父节点的 'children' 列表。
-    parent_stack = {0: nested_catalog}
+    # 栈，下标即层级：parent_stack[k] 是第 k 级节点应挂入的 children 列表（0 为根目录）
+    parent_stack = [nested_catalog]
 
     for item in flat_list:
         level = item.get("level")
@@ -218,23 +286,22 @@ def build_nested_catalog(flat_list: List[Dict[str, Any]]) -> List[Dict[str, Any]
 
         if level is None or name is None:
             continue
+        if level < 1:
+            level = 1
 
         # 创建嵌套格式的新节点
         new_node = {"name": name, "children": []}
 
-        # 在栈中找到正确的父节点（当前节点的上一级）
-        parent_level = level - 1
-        
-        # 如果层级不连续（例如从level 1直接到level 3），向上找到最近的有效父节点
-        while parent_level not in parent_stack and parent_level > 0:
-            parent_level -= 1
-
-        # 默认为根目录
-        parent_list = parent_stack.get(parent_level, nested_catalog)
+        # 丢弃同级及更深层级的旧父节点，栈顶即最近的有效父节点
+        # （层级不连续时，例如从 level 1 直接到 level 3，会挂到最近的上级下）
+        del parent_stack[level:]
+        parent_list = parent_stack[-1]
         parent_list.append(new_node)
-        
-        # 为当前层级更新栈
-        parent_stack[level] = new_node["children"]
+
+        # 补齐跳过的层级，使下标与层级保持一致，再压入当前节点的 children
+        while len(parent_stack) < level:
+            parent_stack.append(parent_list)
+        parent_stack.append(new_node["children"])
 
     return nested_catalog
 
@@ -310,6 +377,10 @@ def extract_section_as_json(full_catalog: List[Dict], section_keyword: str) -> L
     
     return result
 
+# 预先生成的各级缩进字符串（每级2个空格）
+_INDENT_CACHE = tuple("  " * k for k in range(65))
+
+
 def convert_json_to_markdown(catalog_json: List[Dict], indent_level: int = 0, include_descriptions: bool = True) -> str:
     """
     将 JSON 格式的目录结构转换为 Markdown 列表格式。
@@ -322,28 +393,33 @@ def convert_json_to_markdown(catalog_json: List[Dict], indent_level: int = 0, in
     Returns:
         Markdown 格式的目录文本
     """
-    result = []
-    indent = "  " * indent_level  # 每级缩进2个空格
-    
-    for item in catalog_json:
-        name = item.get("name", "")
-        line = f"{indent}- {name}"
+    buf = []
+    # 显式栈先序遍历，逆序压栈以保持原有顺序；所有片段写入同一个 buf，最后只 join 一次
+    stack = [(item, indent_level) for item in reversed(catalog_json)]
+    
+    while stack:
+        item, level = stack.pop()
+        indent = _INDENT_CACHE[level] if level < len(_INDENT_CACHE) else "  " * level  # 每级缩进2个空格
+        if buf:
+            buf.append("\n")
+        buf.append(indent)
+        buf.append("- ")
+        buf.append(str(item.get("name", "")))
         
         # 如果有 content_description 且需要包含，则添加
         if include_descriptions:
             description = item.get("content_description", "")
             if description:
-                line += f"\n{indent}  > {description}"
+                buf.append("\n")
+                buf.append(indent)
+                buf.append("  > ")
+                buf.append(str(description))
         
-        result.append(line)
-        
-        # 递归处理子节点
         children = item.get("children", [])
         if children:
-            child_md = convert_json_to_markdown(children, indent_level + 1, include_descriptions)
-            result.append(child_md)
+            stack.extend((child, level + 1) for child in reversed(children))
     
-    return "\n".join(result)
+    return "".join(buf)
 
 
 def parse_markdown_to_json(markdown_text: str) -> List[Dict[str, Any]]:
@@ -400,8 +476,10 @@ def extract_leaf_nodes(catalog: List[Dict], parent_path: str = "") -> List[Dict]
     返回: [{'path': '路径', 'name': '名称', 'node': 节点引用}, ...]
     """
     leaf_nodes = []
+    stack = [(item, "") for item in reversed(catalog)]
     
-    def traverse(node, path):
+    while stack:
+        node, path = stack.pop()
         current_path = f"{path} > {node['name']}" if path else node['name']
         
         if not node.get('children'):  # 叶子节点
@@ -411,11 +489,7 @@ def extract_leaf_nodes(catalog: List[Dict], parent_path: str = "") -> List[Dict]
                 'node': node  # 保留引用，用于后续回填
             })
         else:
-            for child in node['children']:
-                traverse(child, current_path)
-    
-    for item in catalog:
-        traverse(item, "")
+            stack.extend((child, current_path) for child in reversed(node['children']))
     
     return leaf_nodes
 
@@ -425,34 +499,35 @@ def locate_text_segment(node_name: str, full_text: str, context_lines: int = 50)
     在原文中定位目录对应的文本片段
     返回该目录前后的相关文本（而不是整篇）
     """
-    lines = full_text.split('\n')
-    
-    # 尝试多种匹配模式
-    patterns = [
-        node_name,  # 直接匹配
-        re.escape(node_name),  # 转义特殊字符
-        f"\\d+\\.\\d*\\s*{re.escape(node_name)}",  # 带编号：5.1 投标人基本情况表
-    ]
+    # 直接匹配或带编号匹配（5.1 投标人基本情况表），在全文上只搜索一次
+    match = _node_name_re(node_name).search(full_text)
+    if not match:
+        return ""  # 如果找不到，返回空
     
-    start_idx = -1
+    # 目录名称所在行的行首
+    line_start = full_text.rfind('\n', 0, match.start()) + 1
     
-    # 找到目录名称所在行
-    for i, line in enumerate(lines):
-        for pattern in patterns:
-            if re.search(pattern, line, re.IGNORECASE):
-                start_idx = i
-                break
-        if start_idx != -1:
+    # 往前取2行
+    start = line_start
+    for _ in range(2):
+        if start == 0:
             break
+        start = full_text.rfind('\n', 0, start - 1) + 1
+    
+    # 从所在行起往后取 context_lines 行（end 指向最后一行换行符之后）
+    end = line_start
+    for _ in range(context_lines):
+        newline = full_text.find('\n', end)
+        if newline == -1:
+            end = len(full_text) + 1
+            break
+        end = newline + 1
     
-    if start_idx == -1:
-        return ""  # 如果找不到，返回空
-    
-    # 提取前后文本
-    start = max(0, start_idx - 2)  # 往前取2行
-    end = min(len(lines), start_idx + context_lines)  # 往后取 context_lines 行
-    
-    return '\n'.join(lines[start:end])
+    return full_text[start:end - 1] if end > start else ""
+
+
+# 迭代器耗尽标记，用于显式栈遍历
+_EXHAUSTED = object()
 
 
 def collect_leaf_nodes_with_path(catalog: List[Dict], parent_path: List[str] = None) -> List[Dict]:
@@ -465,28 +540,35 @@ def collect_leaf_nodes_with_path(catalog: List[Dict], parent_path: List[str] = N
     
     Returns:
         包含叶子节点信息的列表，每个元素包含:
-        - path: 节点路径（列表）
+        - path: 节点路径（元组）
         - name: 节点名称
         - node: 节点引用（用于后续修改）
     """
-    if parent_path is None:
-        parent_path = []
-    
+    # 共享一条路径列表做 append/pop，只在产出结果时生成路径元组
+    path = list(parent_path) if parent_path else []
+    base_depth = len(path)
     leaf_nodes = []
+    stack = [iter(catalog)]
     
-    for item in catalog:
-        current_path = parent_path + [item['name']]
+    while stack:
+        item = next(stack[-1], _EXHAUSTED)
+        if item is _EXHAUSTED:
+            stack.pop()
+            if len(path) > base_depth:
+                path.pop()
+            continue
         
-        if not item.get('children') or len(item.get('children', [])) == 0:
+        children = item.get('children')
+        if not children:
             # 叶子节点
             leaf_nodes.append({
-                'path': current_path,
+                'path': (*path, item['name']),
                 'name': item['name'],
                 'node': item
             })
         else:
-            # 递归处理子节点
-            leaf_nodes.extend(collect_leaf_nodes_with_path(item['children'], current_path))
+            path.append(item['name'])
+            stack.append(iter(children))
     
     return leaf_nodes
 
@@ -501,36 +583,46 @@ def collect_all_nodes_with_path(catalog: List[Dict], parent_path: List[str] = No
     
     Returns:
         包含所有节点信息的列表，每个元素包含:
-        - path: 节点路径（列表）
+        - path: 节点路径（元组）
         - name: 节点名称
         - node: 节点引用（用于后续修改）
         - has_children: 是否有子节点
     """
-    if parent_path is None:
-        parent_path = []
-    
+    # 共享一条路径列表做 append/pop，只在产出结果时生成路径元组
+    path = list(parent_path) if parent_path else []
+    base_depth = len(path)
     all_nodes = []
+    stack = [iter(catalog)]
     
-    for item in catalog:
-        current_path = parent_path + [item['name']]
-        has_children = bool(item.get('children') and len(item.get('children', [])) > 0)
+    while stack:
+        item = next(stack[-1], _EXHAUSTED)
+        if item is _EXHAUSTED:
+            stack.pop()
+            if len(path) > base_depth:
+                path.pop()
+            continue
+        
+        children = item.get('children')
+        has_children = bool(children)
         
         all_nodes.append({
-            'path': current_path,
+            'path': (*path, item['name']),
             'name': item['name'],
             'node': item,
             'has_children': has_children
         })
         
-        # 递归处理子节点
         if has_children:
-            all_nodes.extend(collect_all_nodes_with_path(item['children'], current_path))
+            path.append(item['name'])
+            stack.append(iter(children))
     
     return all_nodes
 
 def add_empty_linking_field(nodes: List[Dict]):
-    """递归地为所有节点添加 'linked_template_ids': [] 字段。"""
-    for node in nodes:
+    """为所有节点添加 'linked_template_ids': [] 字段（显式栈遍历）。"""
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
         node['linked_template_ids'] = []
         if node.get('children'):
-            add_empty_linking_field(node['children'])
+            stack.extend(node['children'])
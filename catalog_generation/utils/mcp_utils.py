@@ -10,14 +10,73 @@
 # Input: MCPClient instance, file paths, prompts, etc.
 # Output: File content, LLM responses, SSE events.
 
-import json
+import asyncio
 import httpx
+import orjson
+from functools import lru_cache
 from typing import Dict, AsyncGenerator
 
 from fastmcp import Client as MCPClient
 from ..config import settings
 
 
+# 跨调用复用的 LLM HTTP 客户端（连接池 + HTTP/2 多路复用），按事件循环各建一个，首次使用时创建。
+# 客户端的连接绑定创建它的事件循环，不能跨循环复用或关闭，因此不在循环切换时丢弃旧客户端，
+# 而是统一由 close_http_client 关闭。
+_HTTP_CLIENTS: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_HTTP_CLIENT_LOCKS: Dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+
+
+async def _get_http_client() -> httpx.AsyncClient:
+    """获取当前事件循环共享的 httpx.AsyncClient；客户端不存在或已关闭时重新创建。"""
+    loop = asyncio.get_running_loop()
+    client = _HTTP_CLIENTS.get(loop)
+    if client is not None and not client.is_closed:
+        return client
+    
+    # 所属循环已结束的客户端无法再使用或关闭，清理其引用
+    for stale_loop in [l for l in _HTTP_CLIENTS if l.is_closed()]:
+        del _HTTP_CLIENTS[stale_loop]
+        _HTTP_CLIENT_LOCKS.pop(stale_loop, None)
+    
+    lock = _HTTP_CLIENT_LOCKS.setdefault(loop, asyncio.Lock())
+    async with lock:
+        client = _HTTP_CLIENTS.get(loop)
+        if client is None or client.is_closed:
+            client = _HTTP_CLIENTS[loop] = httpx.AsyncClient(
+                timeout=httpx.Timeout(60.0, connect=5.0),
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+            )
+    return client
+
+
+async def close_http_client() -> None:
+    """
+    关闭全部共享的 LLM HTTP 客户端（在服务关闭时调用）。
+    当前循环的客户端直接关闭；其他仍在运行的循环上的客户端提交到所属循环关闭并等待完成；
+    所属循环已关闭的客户端无法再关闭，仅移除引用。
+    """
+    current = asyncio.get_running_loop()
+    pending = []
+    for loop, client in list(_HTTP_CLIENTS.items()):
+        del _HTTP_CLIENTS[loop]
+        _HTTP_CLIENT_LOCKS.pop(loop, None)
+        if client.is_closed or loop.is_closed():
+            continue
+        if loop is current:
+            pending.append(client.aclose())
+        elif loop.is_running():
+            pending.append(asyncio.wrap_future(asyncio.run_coroutine_threadsafe(client.aclose(), loop)))
+        else:
+            print("⚠️ HTTP 客户端所属的事件循环未在运行，无法关闭")
+    
+    results = await asyncio.gather(*pending, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"⚠️ 关闭 HTTP 客户端失败: {result}")
+
+
 def sse(event: str, data_obj: Dict) -> str:
     """
     将事件类型和数据对象，格式化为符合 SSE 规范的字符串。
@@ -29,7 +88,24 @@ def sse(event: str, data_obj: Dict) -> str:
     Returns:
         str: SSE 格式的文本块。
     """
-    return f"event: {event}\n" + f"data: {json.dumps(data_obj, ensure_ascii=False, default=str)}\n\n"
+    payload = orjson.dumps(data_obj, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+@lru_cache(maxsize=256)
+def sse_static(event: str, **fields: str) -> str:
+    """
+    生成内容固定的 SSE 文本块（如 phase_start/phase_end、固定提示语、产物路径），
+    相同参数只编码一次，之后直接复用缓存结果。
+    
+    Args:
+        event (str): 事件类型。
+        **fields: 数据字段，值须可哈希（通常为字符串）。
+    
+    Returns:
+        str: SSE 格式的文本块，与 sse(event, fields) 相同。
+    """
+    return sse(event, fields)
 
 
 async def mcp_read_file(mcp_client: MCPClient, file_path: str) -> str | None:
@@ -53,41 +129,103 @@ async def mcp_read_file(mcp_client: MCPClient, file_path: str) -> str | None:
         return None
 
 
-async def mcp_smart_write(mcp_client: MCPClient, file_path: str, content: str) -> bool:
+def _tool_text(result) -> str:
+    """取出 MCP 工具调用结果中的文本（工具以返回字符串的方式报告成功或错误）。"""
+    return str(getattr(result, "data", result))
+
+
+async def mcp_smart_write(mcp_client: MCPClient, file_path: str, content: str | bytes) -> bool:
     """
-    通过 MCP 服务写入文件内容。
-    如果文件已存在，先读取原内容再替换；如果不存在，直接创建。
+    通过 MCP 服务写入文件内容（整体覆盖）。
+    优先调用 write_file 直接写入，以其返回状态作为结果；write_file 返回错误（如磁盘已满、
+    无权限）时直接判定失败。只有服务端没有 write_file 工具（调用本身抛出异常）时，
+    才回退为先读取原内容再用 smart_edit 替换，并以 smart_edit 的返回状态作为结果。
     
     Args:
         mcp_client: MCP 客户端实例。
         file_path: 文件路径。
-        content: 要写入的内容。
+        content: 要写入的内容，bytes 会按 UTF-8 解码（例如 dump_json 的输出）。
     
     Returns:
         是否写入成功。
     """
+    if isinstance(content, bytes):
+        content = content.decode("utf-8")
     try:
-        # 先尝试读取文件
-        old_content = await mcp_read_file(mcp_client, file_path)
-        
-        if old_content is not None:
-            # 文件存在，用全部内容替换
-            await mcp_client.call_tool("smart_edit", {
-                "file_path": file_path,
-                "old_string": old_content,
-                "new_string": content
-            })
-        else:
-            # 文件不存在，直接创建
-            await mcp_client.call_tool("smart_edit", {
-                "file_path": file_path,
-                "old_string": "",
-                "new_string": content
-            })
+        write_res = await mcp_client.call_tool("write_file", {"path": file_path, "content": content})
+    except Exception as e:
+        print(f"⚠️ write_file 调用失败，回退为 smart_edit: {file_path}, 错误: {str(e)}")
+        return await _smart_edit_overwrite(mcp_client, file_path, content)
+    
+    write_text = _tool_text(write_res)
+    if "文件已成功写入" in write_text:
         return True
+    print(f"❌ 文件写入失败: {file_path}, 错误: {write_text}")
+    return False
+
+
+async def _smart_edit_overwrite(mcp_client: MCPClient, file_path: str, content: str) -> bool:
+    """
+    write_file 不可用时的回退：文件存在时用全部原内容作为 old_string 替换，不存在时直接创建。
+    
+    Returns:
+        smart_edit 是否报告成功。
+    """
+    old_content = await mcp_read_file(mcp_client, file_path)
+    try:
+        edit_res = await mcp_client.call_tool("smart_edit", {
+            "file_path": file_path,
+            "old_string": old_content or "",
+            "new_string": content
+        })
     except Exception as e:
         print(f"❌ 文件写入失败: {file_path}, 错误: {str(e)}")
         return False
+    
+    edit_text = _tool_text(edit_res)
+    if "成功" in edit_text:
+        return True
+    print(f"❌ 文件写入失败: {file_path}, 错误: {edit_text}")
+    return False
+
+
+async def consume_llm_stream(
+    stream: AsyncGenerator,
+    log_id: str,
+    result: Dict[str, str]
+) -> AsyncGenerator[str, None]:
+    """
+    消费 call_llm_streaming 的输出：逐个转发 debug_token_delta 事件，
+    结束后（含异常中断）将累积的完整文本写入 result["content"]。
+    
+    用法:
+        result = {}
+        async for frame in consume_llm_stream(call_llm_streaming(...), log_id, result):
+            yield frame
+        text = result["content"]
+    
+    Args:
+        stream: call_llm_streaming 返回的异步生成器（需 yield_tokens=True）。
+        log_id: 前端调试日志面板的 ID。
+        result: 调用方持有的结果字典，用于取回完整文本。
+    """
+    parts = []
+    try:
+        async for event in stream:
+            if not isinstance(event, str) or not event.startswith("event: token_delta\n"):
+                continue
+            data_start = event.find("data: ")
+            if data_start < 0:
+                continue
+            try:
+                delta = orjson.loads(event[data_start + 6:]).get("delta", "")
+            except orjson.JSONDecodeError:
+                continue
+            if delta:
+                parts.append(delta)
+                yield sse("debug_token_delta", {"log_id": log_id, "delta": delta})
+    finally:
+        result["content"] = "".join(parts)
 
 
 async def call_llm_streaming(
@@ -121,47 +259,58 @@ async def call_llm_streaming(
     }
     
     try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            async with client.stream("POST", api_url, headers=headers, json=payload) as response:
-                response.raise_for_status()
-                
-                full_response = ""
-                buffer = ""
-                done = False
+        client = await _get_http_client()
+        async with client.stream("POST", api_url, headers=headers, json=payload) as response:
+            response.raise_for_status()
+            
+            response_parts = []
+            # 增量解析 SSE 行：bytearray 缓冲 + 扫描位置，避免反复切分/拼接字符串
+            buffer = bytearray()
+            scan_pos = 0
+            done = False
 
-                async for text_chunk in response.aiter_text():
-                    if done:
+            async for byte_chunk in response.aiter_bytes():
+                buffer += byte_chunk
+                
+                while True:
+                    newline = buffer.find(b"\n", scan_pos)
+                    if newline < 0:
+                        break
+                    line = buffer[scan_pos:newline].strip()
+                    scan_pos = newline + 1
+                    
+                    if not line.startswith(b"data:"):
+                        continue
+                    
+                    data_line = line[5:].strip()
+                    if data_line == b"[DONE]":
+                        done = True
                         break
                     
-                    buffer += text_chunk
+                    try:
+                        data = orjson.loads(data_line)
+                    except orjson.JSONDecodeError:
+                        # 按行切分后的 data 行应是完整 JSON，无法解析则跳过
+                        continue
                     
-                    while "\n" in buffer:
-                        line, buffer = buffer.split("\n", 1)
-                        
-                        if not line.strip():
-                            continue
-                        
-                        if line.startswith("data: "):
-                            data_line = line[len("data: "):].strip()
-                            if data_line == "[DONE]":
-                                done = True
-                                break
-                            
-                            try:
-                                data = json.loads(data_line)
-                                if "choices" in data and len(data["choices"]) > 0:
-                                    delta = data["choices"][0].get("delta", {})
-                                    content = delta.get("content")
-                                    if content:
-                                        full_response += content
-                                        if yield_tokens:
-                                            yield sse("token_delta", {"delta": content})
-                            except json.JSONDecodeError:
-                                # Incomplete JSON, put it back and wait for the next chunk
-                                buffer = line + "\n" + buffer
-                                break
+                    choices = data.get("choices") if isinstance(data, dict) else None
+                    if choices:
+                        content = choices[0].get("delta", {}).get("content")
+                        if content:
+                            response_parts.append(content)
+                            if yield_tokens:
+                                yield sse("token_delta", {"delta": content})
+                
+                if done:
+                    break
                 
-                yield {"type": "final", "content": full_response}
+                # 已消费的前缀过长时整体丢弃，保持缓冲区较小
+                if scan_pos > 4096:
+                    del buffer[:scan_pos]
+                    scan_pos = 0
+            
+            full_response = "".join(response_parts)
+            yield {"type": "final", "content": full_response}
 
     except Exception as e:
         print(f"\n❌ LLM API调用失败: {str(e)}")
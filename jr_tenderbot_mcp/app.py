@@ -1,8 +1,22 @@
-from server import mcp
+from contextlib import asynccontextmanager
+from server import mcp, shutdown_tools
 import uvicorn
 
 # 配置 http 应用，并指定路径为
 app = mcp.http_app()
 
+_mcp_lifespan = app.router.lifespan_context
+
+@asynccontextmanager
+async def _lifespan(asgi_app):
+    """在 MCP 自身的生命周期之外，于服务关闭时（事件循环仍在运行）释放工具资源。"""
+    try:
+        async with _mcp_lifespan(asgi_app) as state:
+            yield state
+    finally:
+        await shutdown_tools()
+
+app.router.lifespan_context = _lifespan
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
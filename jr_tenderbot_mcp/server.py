@@ -1,6 +1,11 @@
 import os
+import sys
+import ast
 import inspect
 import importlib
+import importlib.util
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
+from pydantic import Field
 from fastmcp import FastMCP
 from fastmcp.tools import Tool
 
@@ -18,50 +23,201 @@ TOOLS_DIR = os.path.join(SCRIPT_DIR, "tools")  # 工具目录
 if not os.path.exists(BASE_DIR):
     os.makedirs(BASE_DIR)
 
+# 工具参数注解中可直接使用的名称（生成延迟加载占位函数时用于求值签名）
+_SIGNATURE_NAMESPACE = {
+    "Annotated": Annotated,
+    "Optional": Optional,
+    "Union": Union,
+    "List": List,
+    "Dict": Dict,
+    "Literal": Literal,
+    "Any": Any,
+    "Field": Field,
+}
+
+def _import_tool_module(module_name: str):
+    """导入单个工具模块，返回 (模块, 异常)。"""
+    try:
+        return importlib.import_module(module_name), None
+    except ImportError as e:
+        return None, e
+
+def _find_impl_function(module, tool_name: str):
+    """优先按约定名 <tool_name>_impl 直接取实现函数，找不到再扫描模块成员。"""
+    func = getattr(module, f"{tool_name}_impl", None)
+    if inspect.isfunction(func):
+        return func
+    for name, member in inspect.getmembers(module, inspect.isfunction):
+        if name.endswith("_impl"):
+            return member
+    return None
+
+def _find_impl_def(tree: ast.Module, tool_name: str):
+    """在模块语法树顶层查找实现函数定义：优先 <tool_name>_impl，其次任意 *_impl。"""
+    impl_defs = [
+        node for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.endswith("_impl")
+    ]
+    for node in impl_defs:
+        if node.name == f"{tool_name}_impl":
+            return node
+    return impl_defs[0] if impl_defs else None
+
+def _eval_signature_expr(expr, filename: str):
+    """在 _SIGNATURE_NAMESPACE 下对注解或默认值表达式求值；expr 为 None 时返回 None。"""
+    if expr is None:
+        return None
+    code = compile(ast.Expression(body=expr), filename, "eval")
+    return eval(code, dict(_SIGNATURE_NAMESPACE))
+
+def _build_signature(node, filename: str) -> inspect.Signature:
+    """按实现函数定义的参数、注解与默认值构造 inspect.Signature。"""
+    args = node.args
+    empty = inspect.Parameter.empty
+
+    def make_param(arg, kind, default=empty):
+        annotation = _eval_signature_expr(arg.annotation, filename) if arg.annotation else empty
+        return inspect.Parameter(arg.arg, kind, default=default, annotation=annotation)
+
+    positional = args.posonlyargs + args.args
+    defaults = [empty] * (len(positional) - len(args.defaults)) + [
+        _eval_signature_expr(d, filename) for d in args.defaults
+    ]
+    params = [
+        make_param(arg, inspect.Parameter.POSITIONAL_ONLY if i < len(args.posonlyargs)
+                   else inspect.Parameter.POSITIONAL_OR_KEYWORD, default)
+        for i, (arg, default) in enumerate(zip(positional, defaults))
+    ]
+    if args.vararg:
+        params.append(make_param(args.vararg, inspect.Parameter.VAR_POSITIONAL))
+    for arg, default in zip(args.kwonlyargs, args.kw_defaults):
+        params.append(make_param(
+            arg, inspect.Parameter.KEYWORD_ONLY,
+            empty if default is None else _eval_signature_expr(default, filename)
+        ))
+    if args.kwarg:
+        params.append(make_param(args.kwarg, inspect.Parameter.VAR_KEYWORD))
+
+    returns = _eval_signature_expr(node.returns, filename) if node.returns else empty
+    return inspect.Signature(params, return_annotation=returns)
+
+def _build_lazy_stub(node, module_name: str, filename: str):
+    """
+    按实现函数的签名（参数、注解、默认值、文档字符串）生成同名占位函数。
+    FastMCP 据此生成与真实实现一致的参数 schema；占位函数首次被调用时才导入工具模块，
+    之后直接转发给真实实现。注解中用到 _SIGNATURE_NAMESPACE 以外的名称时抛出 NameError。
+    """
+    signature = _build_signature(node, filename)
+    impl = None
+
+    def load_impl():
+        nonlocal impl
+        if impl is None:
+            impl = getattr(importlib.import_module(module_name), node.name)
+        return impl
+
+    if isinstance(node, ast.AsyncFunctionDef):
+        async def stub(*args, **kwargs):
+            return await load_impl()(*args, **kwargs)
+    else:
+        def stub(*args, **kwargs):
+            return load_impl()(*args, **kwargs)
+
+    stub.__name__ = stub.__qualname__ = node.name
+    stub.__module__ = module_name
+    stub.__doc__ = ast.get_docstring(node)
+    stub.__signature__ = signature
+    stub.__annotations__ = {
+        name: param.annotation for name, param in signature.parameters.items()
+        if param.annotation is not inspect.Parameter.empty
+    }
+    if signature.return_annotation is not inspect.Signature.empty:
+        stub.__annotations__["return"] = signature.return_annotation
+    return stub
+
+def _load_tool_function(tool_name: str):
+    """
+    解析工具源码得到 (待注册函数, 文档字符串)，不导入工具模块本身。
+    签名无法在预置名称下求值时，退回为立即导入模块并取真实实现。
+    """
+    module_name = f"tools.{tool_name}"
+    filename = os.path.join(TOOLS_DIR, f"{tool_name}.py")
+    # 启动时确认模块可被导入系统定位，找不到的工具不注册
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError) as e:
+        spec, error = None, e
+    else:
+        error = "未找到模块"
+    if spec is None:
+        print(f"无法导入模块 {module_name}: {error}")
+        return None, None
+
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), filename=filename)
+    except (OSError, SyntaxError) as e:
+        print(f"无法解析模块 {module_name}: {e}")
+        return None, None
+
+    node = _find_impl_def(tree, tool_name)
+    if node is None:
+        print(f"警告: 在模块 {module_name} 中未找到有效的工具实现函数。")
+        return None, None
+    description = ast.get_docstring(node)
+
+    try:
+        return _build_lazy_stub(node, module_name, filename), description
+    except Exception:
+        module, error = _import_tool_module(module_name)
+        if error is not None:
+            print(f"无法导入模块 {module_name}: {error}")
+            return None, None
+        return _find_impl_function(module, tool_name), description
+
 def register_tools_from_directory(mcp_instance: FastMCP):
     """
-    自动扫描tools目录,动态导入并注册所有工具。
+    自动扫描tools目录，解析各工具模块的源码并注册延迟加载的占位函数：
+    启动时不导入任何工具模块，每个模块在其工具第一次被调用时才导入。
     """
     if not os.path.exists(TOOLS_DIR):
         print(f"错误: tools目录不存在: {TOOLS_DIR}")
         return
     
-    for filename in os.listdir(TOOLS_DIR):
-        if filename.endswith(".py") and not filename.startswith("__"):
-            module_name = f"tools.{filename[:-3]}"
-            tool_name = filename[:-3]
-
-            try:
-                module = importlib.import_module(module_name)
-                func_to_register = None
-
-                for name, func in inspect.getmembers(module, inspect.isfunction):
-                    if name.endswith("_impl"):
-                        func_to_register = func
-                        break
-                
-                if func_to_register:
-                    description = inspect.getdoc(func_to_register)
-                    if not description:
-                        print(f"警告: 工具 '{tool_name}' 的实现函数缺少文档字符串,已跳过。")
-                        continue
-
-                    base_tool = mcp_instance.tool(func_to_register)
-
-                    transformed_tool = Tool.from_tool(
-                        tool=base_tool,
-                        name=tool_name,
-                        description=description
-                    )
-                    
-                    mcp_instance.add_tool(transformed_tool)
-
-                    base_tool.disable()
-                else:
-                    print(f"警告: 在模块 {module_name} 中未找到有效的工具实现函数。")
-
-            except ImportError as e:
-                print(f"无法导入模块 {module_name}: {e}")
+    tool_names = [
+        filename[:-3] for filename in os.listdir(TOOLS_DIR)
+        if filename.endswith(".py") and not filename.startswith("__")
+    ]
+    
+    for tool_name in tool_names:
+        func_to_register, description = _load_tool_function(tool_name)
+        if func_to_register is None:
+            continue
+
+        if not description:
+            print(f"警告: 工具 '{tool_name}' 的实现函数缺少文档字符串,已跳过。")
+            continue
+
+        base_tool = mcp_instance.tool(func_to_register)
+
+        transformed_tool = Tool.from_tool(
+            tool=base_tool,
+            name=tool_name,
+            description=description
+        )
+        
+        mcp_instance.add_tool(transformed_tool)
+
+        base_tool.disable()
+
+async def shutdown_tools():
+    """
+    服务关闭时释放工具持有的进程级资源。
+    目前只有 web_fetch 的共享 Chromium；模块从未被导入过时，说明浏览器也未启动，无需处理。
+    """
+    web_fetch = sys.modules.get("tools.web_fetch")
+    if web_fetch is not None:
+        await web_fetch.close_browser()
 
 # 自动注册工具
 register_tools_from_directory(mcp)
@@ -3,8 +3,22 @@ from pathlib import Path
 from typing import Optional, List, Annotated
 from pydantic import Field
 from utils.file_util import get_safe_path, is_url, get_runtime_subdir, download_to, BASE_DIR
-from docling.document_converter import DocumentConverter
 import os
+import threading
+
+# DocumentConverter 构造时会加载模型/流水线，进程内只创建一次并复用。
+# convert() 未声明线程安全，因此转换过程同样串行化。
+_CONVERTER = None
+_CONVERTER_LOCK = threading.Lock()
+
+def _get_converter():
+    """获取（首次调用时创建）共享的 DocumentConverter 实例。调用方需持有 _CONVERTER_LOCK。"""
+    global _CONVERTER
+    if _CONVERTER is None:
+        # docling 导入开销很大，推迟到第一次转换时再加载，避免拖慢 MCP 服务启动
+        from docling.document_converter import DocumentConverter
+        _CONVERTER = DocumentConverter()
+    return _CONVERTER
 
 def file_to_md_impl(
     path: Annotated[str, Field(description="要转换为 Markdown 的文件的本地路径或 URL。")]
@@ -44,82 +58,83 @@ def _get_source_path(source: str) -> Path:
 
 def _convert_to_markdown_content(src_path: Path) -> str:
     """使用 docling 将文件转换为 Markdown 内容。"""
-    converter = DocumentConverter()
-    
-    try:
-        result = converter.convert(str(src_path))
-        doc = result.document
-        markdown_content = doc.export_to_markdown(image_mode="referenced")
-    finally:
-        os.chdir(Path(BASE_DIR).parent.resolve()) # 无论成功与否，都切回原工作目录
+    with _CONVERTER_LOCK:
+        try:
+            result = _get_converter().convert(str(src_path))
+            doc = result.document
+            markdown_content = doc.export_to_markdown(image_mode="referenced")
+        finally:
+            os.chdir(Path(BASE_DIR).parent.resolve()) # 无论成功与否，都切回原工作目录
         
     return markdown_content
 
 def _clean_markdown_table(md_content: str) -> str:
     """清理和规范化 Markdown 表格，确保格式统一。"""
-    lines = md_content.split('\n')
     output_lines = []
-    in_table = False
     table_lines = []
-
-    for line in lines:
-        is_table_line = line.strip().startswith('|') and line.strip().endswith('|')
-
-        if is_table_line:
-            if not in_table:
-                in_table = True
+    num_cols = 0
+    pos = 0
+    length = len(md_content)
+
+    # 单次扫描：逐行定位，每行只 strip 一次，同时累计表格列数
+    while pos <= length:
+        end = md_content.find('\n', pos)
+        if end < 0:
+            end = length
+        line = md_content[pos:end]
+        stripped = line.strip()
+
+        if stripped[:1] == '|' and stripped[-1:] == '|':
             table_lines.append(line)
+            cell_count = stripped.strip('|').count('|') + 1
+            if cell_count > num_cols:
+                num_cols = cell_count
         else:
-            if in_table:
-                output_lines.extend(_process_table(table_lines))
+            if table_lines:
+                output_lines.extend(_process_table(table_lines, num_cols))
                 table_lines = []
-                in_table = False
+                num_cols = 0
             output_lines.append(line)
 
-    if in_table:
-        output_lines.extend(_process_table(table_lines))
+        pos = end + 1
+
+    if table_lines:
+        output_lines.extend(_process_table(table_lines, num_cols))
 
     return '\n'.join(output_lines)
 
-def _process_table(table_lines: List[str]) -> List[str]:
-    """处理单个 Markdown 表格的内部逻辑。"""
+# 对齐方式 -> 标准分隔符单元格
+_ALIGN_SEP = {'center': ':---:', 'right': '---:', 'left': ':---'}
+
+def _separator_cell(cell: str) -> str:
+    """根据原分隔符单元格两端的冒号确定对齐方式，返回标准分隔符单元格。"""
+    left = cell[:1] == ':'
+    right = cell[-1:] == ':'
+    if left and right:
+        return _ALIGN_SEP['center']
+    if right and not left:
+        return _ALIGN_SEP['right']
+    return _ALIGN_SEP['left'] # 默认为左对齐
+
+def _process_table(table_lines: List[str], num_cols: Optional[int] = None) -> List[str]:
+    """处理单个 Markdown 表格的内部逻辑。num_cols 可由调用方在扫描时预先算好。"""
     if len(table_lines) < 2:
         return table_lines
 
-    # 规范化表格数据，确保每行都有相同的列数
-    table_data = [[cell.strip() for cell in line.strip().strip('|').split('|')] for line in table_lines]
-    num_cols = max(len(row) for row in table_data) if table_data else 0
+    if num_cols is None:
+        num_cols = max(line.strip().strip('|').count('|') + 1 for line in table_lines)
     if num_cols == 0: return []
 
-    for i, row in enumerate(table_data):
-        if len(row) != num_cols:
-            table_data[i].extend([''] * (num_cols - len(row)))
-
-    # 分析对齐方式
-    separator_row = table_data[1]
-    alignments = []
-    for cell in separator_row:
-        left = cell.startswith(':')
-        right = cell.endswith(':')
-        if left and right:
-            alignments.append('center')
-        elif left:
-            alignments.append('left')
-        elif right:
-            alignments.append('right')
-        else:
-            alignments.append('left') # 默认为左对齐
+    # 单次遍历：切分单元格、补齐列数并直接生成输出行（第 2 行为标准分隔符行）
+    processed_lines = [None] * len(table_lines)
+    for i, line in enumerate(table_lines):
+        row = [cell.strip() for cell in line.strip().strip('|').split('|')]
+        if len(row) < num_cols:
+            row.extend([''] * (num_cols - len(row)))
 
-    # 构建处理后的表格
-    processed_lines = []
-    for i, row in enumerate(table_data):
         if i == 1:
-            # 生成标准的分隔符行
-            separator_parts = [':---:' if align == 'center' else '---:' if align == 'right' else ':---' for align in alignments]
-            processed_lines.append('|' + '|'.join(separator_parts) + '|')
+            processed_lines[i] = '|' + '|'.join([_separator_cell(cell) for cell in row]) + '|'
         else:
-            processed_lines.append('| ' + ' | '.join(row) + ' |')
+            processed_lines[i] = '| ' + ' | '.join(row) + ' |'
 
     return processed_lines
-
-
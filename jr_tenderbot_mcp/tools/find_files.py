@@ -1,10 +1,44 @@
 import os
+import re
 from datetime import datetime
-from fnmatch import fnmatchcase
+from fnmatch import translate
 from typing import Annotated
 from pydantic import Field
 from utils.file_util import get_safe_path, BASE_DIR
 
+def _get_mtime_ms(entry: os.DirEntry) -> float:
+    """返回文件修改时间（毫秒），无法获取时返回 0。"""
+    try:
+        return entry.stat().st_mtime * 1000
+    except OSError:
+        return 0
+
+def _iter_files(top: str):
+    """
+    使用 os.scandir 递归遍历目录，按 os.walk 的顺序产出文件的 DirEntry。
+    与 os.walk 一致：不进入符号链接目录，指向文件的符号链接视为文件，无法读取的目录直接跳过。
+    """
+    stack = [top]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        sub_dirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                yield entry
+            elif not entry.is_symlink():
+                sub_dirs.append(entry.path)
+        stack.extend(reversed(sub_dirs))
+
 def find_files_impl(
     pattern: Annotated[str, Field(description="要匹配的 glob 模式 (例如, '**/*.py', 'docs/*.md')。")], 
     path: Annotated[str, Field(description="可选：在其内搜索的目录路径。如果省略，则在根目录中搜索。")] = ".", 
@@ -23,17 +57,13 @@ def find_files_impl(
         return f"错误: 无效的搜索路径: {e}"
 
     # 2. 执行 Glob 搜索
-    all_files = []
-    for root, _, files in os.walk(safe_search_path):
-        for filename in files:
-            full_path = os.path.join(root, filename)
-            # fnmatchcase 默认区分大小写
-            if not case_sensitive:
-                if fnmatchcase(filename.lower(), pattern.lower()):
-                    all_files.append(full_path)
-            else:
-                if fnmatchcase(filename, pattern):
-                    all_files.append(full_path)
+    # 模式只编译一次；不区分大小写时交给正则引擎处理，无需逐个文件名转小写
+    pattern_re = re.compile(translate(pattern), 0 if case_sensitive else re.IGNORECASE)
+    # 遍历时一并取修改时间：DirEntry.stat() 会复用目录读取时缓存的信息，排序时无需再次 stat
+    all_files = [
+        (entry.path, _get_mtime_ms(entry)) for entry in _iter_files(safe_search_path)
+        if pattern_re.match(entry.name)
+    ]
     
     if not all_files:
         return f"在 '{path}' 内没有找到匹配模式 '{pattern}' 的文件。"
@@ -42,19 +72,13 @@ def find_files_impl(
     now_timestamp_ms = datetime.now().timestamp() * 1000
     one_day_in_ms = 24 * 60 * 60 * 1000
 
-    def get_mtime_ms(p):
-        try:
-            return os.path.getmtime(p) * 1000
-        except OSError:
-            return 0
-
-    def sort_key(p):
-        mtime_ms = get_mtime_ms(p)
+    def sort_key(item):
+        p, mtime_ms = item
         is_recent = (now_timestamp_ms - mtime_ms) < one_day_in_ms
         # 如果是最近的，按时间倒序；否则，按路径字母顺序
         return (not is_recent, -mtime_ms if is_recent else p.lower())
 
-    sorted_paths = sorted(all_files, key=sort_key)
+    sorted_paths = [p for p, _ in sorted(all_files, key=sort_key)]
     
     # 转换为相对于 BASE_DIR 的路径
     relative_paths = [os.path.relpath(p, BASE_DIR) for p in sorted_paths]
@@ -1,9 +1,175 @@
+import io
+import mmap
 import os
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Annotated
 from pydantic import Field
 from utils.file_util import get_safe_path, BASE_DIR
 
+# 按扩展名直接跳过的二进制文件，无需打开
+_BINARY_EXTS = frozenset({
+    '.pdf', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.webp',
+    '.zip', '.gz', '.tar', '.7z', '.rar', '.mp3', '.mp4',
+    '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+    '.bin', '.exe', '.dll', '.so', '.pyc',
+})
+# 与 grep 相同，文件头部出现 NUL 字节即视为二进制文件
+_SNIFF_SIZE = 4096
+# 小文件逐行读取时使用的缓冲区大小
+_READ_BUFFER_SIZE = io.DEFAULT_BUFFER_SIZE * 4
+# 不小于该大小的文件改用 mmap + bytes 正则扫描，省去逐行解码
+_MMAP_THRESHOLD = 64 * 1024
+# 在 bytes 与 str 上语义不同、或可能跨行匹配的正则写法：含这些写法时只走逐行解码的路径
+_UNSAFE_BYTES_PATTERN_RE = re.compile(r'\\[wWbBdDsSnrtvfZAN0-9xuU]|\.|\[\^|\$|\n')
+# 正则元字符；不含这些字符（且不含换行）的模式按普通子串处理
+_REGEX_META = frozenset('.^$*+?{}[]|()\\\r\n')
+# 子串快速路径下每次小写化的块大小，块边界对齐到换行
+_LITERAL_BLOCK_SIZE = 1024 * 1024
+# 扫描线程数；Windows 上等待句柄数有上限，最多 60 个
+_MAX_WORKERS = min(os.cpu_count() or 1, 60) if sys.platform == "win32" else (os.cpu_count() or 1)
+
+def _iter_files(top: str, rel_top: str):
+    """
+    使用 os.scandir 递归遍历目录，按 os.walk 的顺序产出 (文件绝对路径, 相对 BASE_DIR 的路径)。
+    以 '.' 开头的隐藏文件和目录直接跳过；相对路径通过字符串拼接得到，避免逐个调用 os.path.relpath。
+    """
+    stack = [(top, rel_top)]
+    while stack:
+        current, rel_current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        sub_dirs = []
+        for entry in entries:
+            name = entry.name
+            if name.startswith('.'):
+                continue
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                yield entry.path, rel_current + name
+            elif not entry.is_symlink():
+                sub_dirs.append((entry.path, rel_current + name + os.sep))
+        stack.extend(reversed(sub_dirs))
+
+def _compile_bytes_pattern(pattern: str):
+    """
+    将纯 ASCII 且逐行语义与 str 一致的正则编译为 bytes 正则（多行模式，忽略大小写），
+    不满足条件时返回 None。
+    """
+    if not pattern.isascii() or _UNSAFE_BYTES_PATTERN_RE.search(pattern):
+        return None
+    try:
+        return re.compile(pattern.encode('ascii'), re.IGNORECASE | re.MULTILINE)
+    except re.error:
+        return None
+
+def _literal_needle(pattern: str):
+    """模式不含正则元字符时返回其小写形式，供子串查找使用；否则返回 None。"""
+    if not pattern or not _REGEX_META.isdisjoint(pattern):
+        return None
+    return pattern.lower()
+
+def _scan_literal(mm: mmap.mmap, needle: bytes):
+    """
+    用 bytes.find 在映射上查找小写 ASCII 子串，忽略大小写。
+    按换行对齐的块小写化后查找，每个匹配行只产出一次 (行号, 去除首尾空白的原始行文本)。
+    """
+    size = len(mm)
+    block_start = 0
+    line_num = 1
+    while block_start < size:
+        block_end = mm.find(b'\n', min(block_start + _LITERAL_BLOCK_SIZE, size))
+        block_end = size if block_end == -1 else block_end + 1
+        block = mm[block_start:block_end].lower()
+        pos = 0
+        counted_to = 0
+        while True:
+            i = block.find(needle, pos)
+            if i == -1:
+                break
+            line_start = block.rfind(b'\n', 0, i) + 1
+            line_end = block.find(b'\n', i)
+            if line_end == -1:
+                line_end = len(block)
+            line_num += block.count(b'\n', counted_to, line_start)
+            counted_to = line_start
+            line = mm[block_start + line_start:block_start + line_end]
+            yield line_num, line.decode('utf-8', errors='ignore').strip()
+            pos = line_end + 1
+        line_num += block.count(b'\n', counted_to)
+        block_start = block_end
+
+def _scan_mmap(mm: mmap.mmap, bregex: re.Pattern):
+    """在整个映射上用 bytes 正则查找匹配，每个匹配行只产出一次 (行号, 去除首尾空白的行文本)。"""
+    size = len(mm)
+    pos = 0
+    line_num = 1
+    counted_to = 0
+    while pos < size:
+        m = bregex.search(mm, pos)
+        if not m:
+            break
+        start = m.start()
+        if start == size and mm[size - 1] == 0x0A:
+            # 末尾换行之后不存在新的一行
+            break
+        line_start = mm.rfind(b'\n', 0, start) + 1
+        line_end = mm.find(b'\n', start)
+        if line_end == -1:
+            line_end = size
+        # 行号按增量统计，每段字节只数一次（mmap 自身的 count 需 Python 3.13+）
+        line_num += mm[counted_to:line_start].count(b'\n')
+        counted_to = line_start
+        yield line_num, mm[line_start:line_end].decode('utf-8', errors='ignore').strip()
+        pos = line_end + 1
+
+def _scan_one(item, regex: re.Pattern, bregex, literal, bliteral):
+    """扫描单个文件，返回 "相对路径:行号:行内容" 形式的匹配列表；二进制或无法读取的文件返回空列表。"""
+    file_path, relative_path = item
+    matches = []
+    if os.path.splitext(file_path)[1].lower() in _BINARY_EXTS:
+        return matches
+    try:
+        with open(file_path, 'rb', buffering=_READ_BUFFER_SIZE) as raw:
+            # 跳过非文本文件：嗅探头部是否含 NUL 字节
+            if b'\x00' in raw.read(_SNIFF_SIZE):
+                return matches
+            # 大文件：映射到内存直接用 bytes 子串查找或 bytes 正则扫描，只解码命中的行
+            if bregex is not None and os.fstat(raw.fileno()).st_size >= _MMAP_THRESHOLD:
+                with mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if bliteral is not None:
+                        hits = _scan_literal(mm, bliteral)
+                    else:
+                        hits = _scan_mmap(mm, bregex)
+                    for line_num, text in hits:
+                        matches.append(f"{relative_path}:{line_num}:{text}")
+                return matches
+            # 头部仍在缓冲区中，回到开头不会重复读盘
+            raw.seek(0)
+            if bregex is not None:
+                # 模式可直接作用于 bytes：逐行匹配原始字节，只解码命中的行
+                for line_num, raw_line in enumerate(raw, 1):
+                    if (bliteral in raw_line.lower()) if bliteral is not None else bregex.search(raw_line):
+                        matches.append(f"{relative_path}:{line_num}:{raw_line.decode('utf-8', errors='ignore').strip()}")
+                return matches
+            f = io.TextIOWrapper(raw, encoding='utf-8', errors='ignore')
+            for line_num, line in enumerate(f, 1):
+                if (literal in line.lower()) if literal is not None else regex.search(line):
+                    matches.append(f"{relative_path}:{line_num}:{line.strip()}")
+    except Exception:
+        # 忽略无法读取的文件
+        pass
+    return matches
+
 def grep_impl(
     pattern: Annotated[str, Field(description="要搜索的正则表达式，搜索时会忽略大小写。")], 
     path: Annotated[str, Field(description="可选：开始搜索的目录路径，默认为根目录 '.'。")] = "."
@@ -23,21 +189,22 @@ def grep_impl(
     except re.error as e:
         return f"错误: 无效的正则表达式: {e}"
 
-    for root, _, files in os.walk(safe_search_path):
-        for file in files:
-            file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, BASE_DIR)
-            
-            try:
-                # 简单地跳过非文本文件
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    for line_num, line in enumerate(f, 1):
-                        if regex.search(line):
-                            matches.append(f"{relative_path}:{line_num}:{line.strip()}")
-            except Exception:
-                # 忽略无法读取的文件
-                continue
-    
+    bregex = _compile_bytes_pattern(pattern)
+    # 普通子串走 str/bytes 的 find，绕过正则引擎
+    literal = _literal_needle(pattern)
+    bliteral = literal.encode('ascii') if literal is not None and literal.isascii() else None
+
+    # 相对路径前缀只计算一次，之后逐级拼接
+    rel_top = os.path.relpath(safe_search_path, BASE_DIR)
+    rel_top = "" if rel_top == "." else rel_top + os.sep
+
+    # 逐文件扫描交给线程池：文件 I/O 与大段正则匹配都会释放 GIL；map 保持遍历顺序
+    paths = list(_iter_files(safe_search_path, rel_top))
+    scan = partial(_scan_one, regex=regex, bregex=bregex, literal=literal, bliteral=bliteral)
+    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as executor:
+        for file_matches in executor.map(scan, paths):
+            matches.extend(file_matches)
+
     if not matches:
         return f"在 '{path}' 目录下没有找到与 '{pattern}' 匹配的内容。"
     
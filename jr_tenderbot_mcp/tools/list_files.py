@@ -17,12 +17,23 @@ def list_files_impl(
         return f"错误: 无效的路径: {e}"
 
     def get_dir_entries(current_path):
+        """返回 (排序后的条目列表, 需要递归进入的子目录路径列表)，目录只枚举一次。"""
         entries = []
-        for entry_name in os.listdir(current_path):
-            full_path = os.path.join(current_path, entry_name)
+        sub_dirs = []
+        # os.scandir 直接带回目录项类型，每个条目只需一次 stat（Windows 上无需额外系统调用）
+        with os.scandir(current_path) as it:
+            dir_entries = list(it)
+        for dir_entry in dir_entries:
+            entry_name = dir_entry.name
             try:
-                stat = os.stat(full_path)
-                is_dir = os.path.isdir(full_path)
+                # 与 os.walk 一致：符号链接指向的目录会列出，但不会递归进入
+                if dir_entry.is_dir() and not dir_entry.is_symlink():
+                    sub_dirs.append((entry_name, dir_entry.path))
+            except OSError:
+                pass
+            try:
+                stat = dir_entry.stat()
+                is_dir = dir_entry.is_dir()
                 
                 # 人类可读的文件大小
                 size = stat.st_size
@@ -44,13 +55,30 @@ def list_files_impl(
         
         # 排序：目录在前，文件在后，然后按名称排序
         entries.sort(key=lambda e: (not e['is_dir'], e['name']))
-        return entries
+        sub_dirs.sort()
+        return entries, sub_dirs
+
+    def walk_dir_entries(top, top_rel_path):
+        """按 os.walk 的自顶向下顺序产出 (相对路径, 条目列表)，复用同一次 scandir 的结果递归。"""
+        stack = [(top, top_rel_path)]
+        while stack:
+            current_path, current_rel_path = stack.pop()
+            try:
+                entries, sub_dirs = get_dir_entries(current_path)
+            except OSError:
+                continue # 与 os.walk 一致，跳过无法读取的目录
+            yield current_rel_path, entries
+            prefix = current_rel_path + os.sep if current_rel_path else ""
+            stack.extend((sub_path, prefix + name) for name, sub_path in reversed(sub_dirs))
 
-    def format_entries(entries, current_rel_path):
-        lines = [f"目录列表: ./{current_rel_path}\n"]
+    def append_entries(out, entries, current_rel_path):
+        """把一个目录的格式化行依次追加到共享的 out 列表，末尾追加空串作为目录之间的分隔。"""
         if not entries:
-            return f"目录 './{current_rel_path}' 为空。\n"
-            
+            out.append(f"目录 './{current_rel_path}' 为空。")
+            out.append("")
+            return
+        out.append(f"目录列表: ./{current_rel_path}\n")
+
         # 找到最长的尺寸字符串长度用于对齐
         max_size_len = 0
         if any(not e['is_dir'] for e in entries):
@@ -60,28 +88,23 @@ def list_files_impl(
             entry_type = "[DIR] " if entry['is_dir'] else "[FILE]"
             size_padding = " " * (max_size_len - len(entry['size'])) if not entry['is_dir'] else " " * max_size_len
             
-            lines.append(
+            out.append(
                 f"{entry_type} {entry['modified_time']}  {size_padding}{entry['size']:>5}  {entry['name']}"
             )
-        return "\n".join(lines) + "\n"
+        out.append("")
 
+    # 所有目录的输出行都写入同一个列表，最后只 join 一次
     output = []
     
+    relative_path = os.path.relpath(safe_path, BASE_DIR)
+    if relative_path == ".": relative_path = ""
+
     if recursive:
-        for root, dirs, _ in os.walk(safe_path):
-            # os.walk 默认先处理顶层目录
-            relative_root = os.path.relpath(root, BASE_DIR)
-            if relative_root == ".": relative_root = ""
-            
-            entries = get_dir_entries(root)
-            output.append(format_entries(entries, relative_root))
-            
-            # 确保子目录排序与 get_dir_entries 一致
-            dirs.sort()
+        # 每个目录只 scandir 一次，子目录按名称排序后递归
+        for relative_root, entries in walk_dir_entries(safe_path, relative_path):
+            append_entries(output, entries, relative_root)
     else:
-        relative_path = os.path.relpath(safe_path, BASE_DIR)
-        if relative_path == ".": relative_path = ""
-        entries = get_dir_entries(safe_path)
-        output.append(format_entries(entries, relative_path))
+        entries, _ = get_dir_entries(safe_path)
+        append_entries(output, entries, relative_path)
 
     return "\n".join(output)
@@ -1,8 +1,43 @@
+import mmap
 import os
+import re
+from itertools import islice
 from typing import Annotated
 from pydantic import Field
 from utils.file_util import get_safe_path
 
+# 超过该大小的文件分页时改用 mmap 按换行定位字节区间，不再逐行生成字符串
+_MMAP_THRESHOLD = 1024 * 1024
+# 统计换行时每次切出的字节块大小
+_COUNT_CHUNK_SIZE = 4 * 1024 * 1024
+# 单独的 '\r' 在文本模式下也算换行，含有它的文件仍走逐行读取
+_LONE_CR_RE = re.compile(rb'\r(?!\n)')
+
+def _count_lines(mm: mmap.mmap) -> int:
+    """按块统计映射中的行数（末行无换行也计为一行），避免一次性复制整个文件。"""
+    size = len(mm)
+    newlines = 0
+    for pos in range(0, size, _COUNT_CHUNK_SIZE):
+        newlines += mm[pos:pos + _COUNT_CHUNK_SIZE].count(b'\n')
+    if size and mm[size - 1] != 0x0A:
+        newlines += 1
+    return newlines
+
+def _read_window_mmap(mm: mmap.mmap, start: int, limit: int):
+    """返回 (第 start 行起最多 limit 行的文本, 实际行数, 文件总行数)；limit 为 -1 时读到文件末尾。"""
+    size = len(mm)
+    total_lines = _count_lines(mm)
+    pos = 0
+    for _ in range(min(start, total_lines)):
+        pos = mm.find(b'\n', pos) + 1 or size
+    count = total_lines - min(start, total_lines)
+    if limit != -1 and limit < count:
+        count = limit
+    end_pos = pos
+    for _ in range(count):
+        end_pos = mm.find(b'\n', end_pos) + 1 or size
+    return mm[pos:end_pos].decode('utf-8'), count, total_lines
+
 def read_file_impl(
     path: Annotated[str, Field(description="要读取的文件的路径。")], 
     offset: Annotated[int, Field(description="可选：开始读取的行号 (0-based)。用于分页。")] = 0, # <-- 核心改动
@@ -21,31 +56,40 @@ def read_file_impl(
 
     try:
         with open(safe_path, "r", encoding="utf-8", newline='') as f:
-            lines = f.readlines()
-        
-        total_lines = len(lines)
-        
-        # --- 核心改动：适配新的默认值 ---
-        if offset == 0 and limit == -1:
-            # 读取整个文件
-            return "".join(lines)
+            # --- 核心改动：适配新的默认值 ---
+            if offset == 0 and limit == -1:
+                # 读取整个文件：一次 read 即可，无需拆成行列表
+                return f.read()
+
+            # 处理分页：只保留请求窗口内的行，其余行只计数不保存
+            start = offset or 0
+            window = None
+            if os.fstat(f.fileno()).st_size > _MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if not _LONE_CR_RE.search(mm):
+                        # 大文件：按换行直接定位窗口的字节区间，只解码这一段
+                        window = _read_window_mmap(mm, start, limit)
+            if window is not None:
+                content, window_lines, total_lines = window
+            else:
+                skipped = sum(1 for _ in islice(f, start))
+                sliced_lines = list(islice(f, limit if limit != -1 else None))
+                total_lines = skipped + len(sliced_lines) + sum(1 for _ in f)
+                content = "".join(sliced_lines)
+                window_lines = len(sliced_lines)
 
-        # 处理分页
-        start = offset or 0
         end = start + (limit if limit != -1 else total_lines)
         
         if start >= total_lines:
             return f"错误: 'offset' ({start}) 超出文件总行数 ({total_lines})。"
             
-        sliced_lines = lines[start:end]
-        
         is_truncated = start > 0 or end < total_lines
         
         if not is_truncated:
-            return "".join(sliced_lines)
+            return content
 
         # 构建截断提示
-        actual_end = start + len(sliced_lines)
+        actual_end = start + window_lines
         next_offset = actual_end
         
         hint = (
@@ -55,7 +99,7 @@ def read_file_impl(
             f"\n--- 文件内容 (截断) ---\n"
         )
         
-        return hint + "".join(sliced_lines)
+        return hint + content
 
     except FileNotFoundError:
         return f"错误: 文件未找到 {path}"
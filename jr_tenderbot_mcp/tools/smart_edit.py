@@ -31,9 +31,10 @@ def smart_edit_impl(
         current_content = f.read()
 
     # 策略 1: 精确匹配
-    occurrences = current_content.count(old_string)
-    if occurrences == 1:
-        new_content = current_content.replace(old_string, new_string, 1)
+    # 最多切两刀：一次扫描即可判断是否唯一，并直接得到替换位置两侧的内容
+    parts = current_content.split(old_string, 2)
+    if len(parts) == 2:
+        new_content = parts[0] + new_string + parts[1]
         with open(safe_path, "w", encoding="utf-8", newline='') as f:
             f.write(new_content)
         return f"文件已通过精确匹配成功编辑: {file_path}"
@@ -48,9 +49,11 @@ def smart_edit_impl(
     
     # 根据最接近的匹配策略报告错误
     if flex_occurrences > 1:
-        return f"错误: 灵活匹配找到 {flex_occurrences} 处匹配项，无法明确编辑。请提供更独特的 old_string。"
+        return "错误: 灵活匹配找到多处匹配项，无法明确编辑。请提供更独特的 old_string。"
 
-    if occurrences > 1:
+    if len(parts) > 2:
+        # 仅在报错时才统计精确匹配的完整次数
+        occurrences = current_content.count(old_string)
         return f"错误: 精确匹配找到 {occurrences} 处匹配项，无法明确编辑。请提供更独特的 old_string。"
     
     return "错误: 未找到任何匹配项 (无论是精确匹配还是灵活匹配)。请使用 read_file 检查文件内容。"
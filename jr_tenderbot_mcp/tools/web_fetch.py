@@ -3,19 +3,58 @@ import asyncio
 import urllib.parse
 from typing import Annotated
 from pydantic import Field
-from bs4 import BeautifulSoup
-from markdownify import markdownify as md
-from utils.file_util import convert_to_raw_github_url, is_private_ip
+from utils.file_util import convert_to_raw_github_url, is_private_ip_async
+
+# 预编译的正则：URL 提取与 Markdown 后处理在每次抓取时都会用到
+_RE_PROMPT_URL = re.compile(r'https?://[^\s]+')
+_RE_URLS = re.compile(r'https?://[a-zA-Z0-9\-._~:/?#[\]@!$&\'()*+,;=%]+')
+_RE_HEADING_TAG = re.compile(r'<h[1-6]', re.IGNORECASE)
+_RE_JS_LINK = re.compile(r'\[(.*?)\]\(javascript:;\)')
+_RE_EMPTY_LINK = re.compile(r'\[\]\((.*?)\)')
+_RE_SYM_LINK = re.compile(r'\[[#\s/]*?\]\((.*?)\)')
+_RE_BLANKLINES = re.compile(r'\n{3,}')
+_RE_ALNUM = re.compile(r'[a-zA-Z0-9]')
+
+# 进程内共享的 Playwright 与 Chromium 实例，首次抓取时启动；每次抓取使用独立的 context 隔离 Cookie
+_PLAYWRIGHT = None
+_BROWSER = None
+_BROWSER_LOCK = asyncio.Lock()
+# 同时打开的页面数上限，避免 URL 很多时 Chromium 占满内存和 CPU
+_FETCH_SEMAPHORE = asyncio.Semaphore(4)
+
+async def _get_browser():
+    """返回共享的无头 Chromium，未启动或已断开时（重新）启动。"""
+    global _PLAYWRIGHT, _BROWSER
+    async with _BROWSER_LOCK:
+        if _BROWSER is None or not _BROWSER.is_connected():
+            if _PLAYWRIGHT is None:
+                from playwright.async_api import async_playwright
+                _PLAYWRIGHT = await async_playwright().start()
+            _BROWSER = await _PLAYWRIGHT.chromium.launch(headless=True)
+        return _BROWSER
+
+async def close_browser():
+    """关闭共享的 Chromium 与 Playwright 驱动，供服务关闭时调用。"""
+    global _PLAYWRIGHT, _BROWSER
+    async with _BROWSER_LOCK:
+        if _BROWSER is not None:
+            await _BROWSER.close()
+            _BROWSER = None
+        if _PLAYWRIGHT is not None:
+            await _PLAYWRIGHT.stop()
+            _PLAYWRIGHT = None
 
 async def _web_fetch_logic(url: str, prompt: str = "") -> str:
     """
     web_fetch 工具的核心实现逻辑。
     """
-    from playwright.async_api import async_playwright
+    # 重量级依赖在首次调用时才导入，避免拖慢 MCP 服务启动
+    from bs4 import BeautifulSoup
+    from markdownify import markdownify as md
 
     # 优先从 prompt 中提取 URL
     if prompt:
-        url_match = re.search(r'https?://[^\s]+', prompt)
+        url_match = _RE_PROMPT_URL.search(prompt)
         if url_match:
             url = url_match.group(0)
         else:
@@ -30,20 +69,20 @@ async def _web_fetch_logic(url: str, prompt: str = "") -> str:
     # 检查是否为私有IP
     try:
         hostname = urllib.parse.urlparse(url).hostname
-        if hostname and is_private_ip(hostname):
+        if hostname and await is_private_ip_async(hostname):
             return f"错误:出于安全原因，不允许访问私有IP地址 ({hostname})。"
     except Exception as e:
         return f"错误: 验证URL主机名时出错: {e}"
 
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+        browser = await _get_browser()
+        context = await browser.new_context()
+        try:
+            page = await context.new_page()
             
             try:
                 await page.goto(url, wait_until="domcontentloaded", timeout=20000)
             except Exception as e:
-                await browser.close()
                 return f"错误: 访问链接 {url} 失败: {type(e).__name__}。WEB_FETCH_FALLBACK_FAILED"
 
             from readability import Document
@@ -52,14 +91,13 @@ async def _web_fetch_logic(url: str, prompt: str = "") -> str:
             html_content = await page.content()
             doc = Document(html_content)
             readable_html = doc.summary() # 这是包含文章主要内容的HTML字符串
-            html_has_headings = re.search(r'<h[1-6]', readable_html, re.IGNORECASE)
+            html_has_headings = _RE_HEADING_TAG.search(readable_html)
 
             # 2. 如果 readability 失败(内容过短或缺少标题)，则降级到清理整个 body
             if not readable_html or len(readable_html) < 200 or not html_has_headings:
-                soup = BeautifulSoup(html_content, "html.parser")
+                soup = BeautifulSoup(html_content, "lxml")
                 target_node = soup.body
                 if not target_node:
-                    await browser.close()
                     return f"无法从 {url} 提取 body 内容。"
                 # 深度清理 body
                 for tag in target_node(["script", "style", "img", "nav", "header", "footer", "aside", "form"]):
@@ -67,7 +105,7 @@ async def _web_fetch_logic(url: str, prompt: str = "") -> str:
                 cleaned_html = str(target_node)
             else:
                 # 3. 如果 readability 成功，则在其基础上进行二次清理
-                soup = BeautifulSoup(readable_html, "html.parser")
+                soup = BeautifulSoup(readable_html, "lxml")
                 # 清理剩余的噪音
                 for tag in soup(["script", "style", "img", "form"]):
                     tag.decompose()
@@ -78,32 +116,37 @@ async def _web_fetch_logic(url: str, prompt: str = "") -> str:
 
             # 5. 对 Markdown 文本进行后处理，优化格式
             # 移除所有指向 javascript:; 的链接，但保留链接文本
-            markdown_content = re.sub(r'\[(.*?)\]\(javascript:;\)', r'\1', markdown_content)
+            markdown_content = _RE_JS_LINK.sub(r'\1', markdown_content)
             # 移除空的 Markdown 链接
-            markdown_content = re.sub(r'\[\]\((.*?)\)', '', markdown_content)
+            markdown_content = _RE_EMPTY_LINK.sub('', markdown_content)
             # 移除只包含'#'或'/'或'##'等符号的链接
-            markdown_content = re.sub(r'\[[#\s/]*?\]\((.*?)\)', '', markdown_content)
+            markdown_content = _RE_SYM_LINK.sub('', markdown_content)
             # 将三个或更多的换行符合并为最多两个
-            markdown_content = re.sub(r'\n{3,}', '\n\n', markdown_content)
-            # 移除行首行尾的空白字符
-            lines = [line.strip() for line in markdown_content.split('\n')]
-            # 移除空行和只包含少量非字母数字字符的行
-            lines = [line for line in lines if line and re.search(r'[a-zA-Z0-9]', line)]
-            markdown_content = '\n'.join(lines)
+            markdown_content = _RE_BLANKLINES.sub('\n\n', markdown_content)
+            # 移除行首行尾的空白字符，并在同一遍中移除空行和只包含少量非字母数字字符的行
+            markdown_content = '\n'.join(
+                s for s in (line.strip() for line in markdown_content.split('\n'))
+                if s and _RE_ALNUM.search(s)
+            )
 
-
-            await browser.close()
-            
             if not markdown_content:
                 return f"无法从 {url} 提取任何文本内容。"
             
             return markdown_content
+        finally:
+            # 只关闭本次抓取的 context，浏览器进程留给后续调用复用
+            await context.close()
 
     except Exception as e:
         error_message = f"执行 web_fetch 时发生错误: {type(e).__name__} - {e}。WEB_FETCH_PROCESSING_ERROR"
         # 移除 print 语句，让测试输出更干净
         return error_message
 
+async def _web_fetch_bounded(url: str) -> str:
+    """在并发上限内执行单个 URL 的抓取。"""
+    async with _FETCH_SEMAPHORE:
+        return await _web_fetch_logic(url)
+
 async def web_fetch_tool_logic(url: str, prompt: str = "") -> str:
     """
     web_fetch 工具的核心并发和格式化逻辑。
@@ -111,7 +154,7 @@ async def web_fetch_tool_logic(url: str, prompt: str = "") -> str:
     # 优先从 prompt 中提取所有 URL，否则使用 url 参数
     text_to_scan = prompt if prompt else url
     # 改进正则表达式，通过白名单字符精确匹配 URL，避免将后续文本错误包含进来
-    urls = re.findall(r'https?://[a-zA-Z0-9\-._~:/?#[\]@!$&\'()*+,;=%]+', text_to_scan)
+    urls = _RE_URLS.findall(text_to_scan)
 
     if not urls:
         # 如果 prompt 和 url 参数都没有提供，则返回错误
@@ -123,8 +166,8 @@ async def web_fetch_tool_logic(url: str, prompt: str = "") -> str:
         else:
             return "错误: 未在输入中找到任何有效的 URL。"
 
-    # 并发执行所有 URL 的抓取
-    tasks = [_web_fetch_logic(u) for u in urls]
+    # 并发执行所有 URL 的抓取（受 _FETCH_SEMAPHORE 限流）
+    tasks = [_web_fetch_bounded(u) for u in urls]
     results = await asyncio.gather(*tasks)
 
     # 格式化并合并所有结果
@@ -4,6 +4,45 @@ import urllib.parse
 from typing import Annotated
 from pydantic import Field
 
+# 预编译的正则：每条搜索结果都会用到
+_RE_WS = re.compile(r'\s+')
+_RE_EXPAND = re.compile(r'展开剩余\d+%内容')
+
+# 在浏览器端一次性提取单条搜索结果的标题、链接、摘要和图片
+_EXTRACT_RESULT_JS = """
+el => {
+    let title = "", href = "", body = "";
+    // 策略1: 匹配卡片式/特殊结果 (如 id="1")
+    let titleEl = el.querySelector("h3.cosc-title a");
+    if (titleEl) {
+        title = titleEl.textContent;
+        href = titleEl.getAttribute("href");
+        const bodyEl = el.querySelector(".summary_22rnB > span");
+        if (bodyEl) body = bodyEl.textContent;
+    }
+    // 策略2: 匹配常规搜索结果 (如 id="2", id="3")
+    if (!title) {
+        titleEl = el.querySelector("h3[class^='t'] a");
+        if (titleEl) {
+            title = titleEl.textContent;
+            href = titleEl.getAttribute("href");
+        }
+        const bodyEl = el.querySelector(".c-abstract, .summary-text_560AW");
+        if (bodyEl) body = bodyEl.textContent;
+    }
+    // 直接从 <img> 标签的 src 属性获取图片链接
+    const imageEl = el.querySelector("img.cos-image-body, img._img_14uts_11");
+    return {
+        title: title,
+        href: href,
+        body: body,
+        image_url: imageEl ? imageEl.getAttribute("src") : "",
+        // 仅在未找到摘要时才需要整块文本作为后备
+        full_text: body ? null : el.textContent,
+    };
+}
+"""
+
 async def _get_real_url(page, url):
     """访问百度中转链接并返回跳转后的真实URL"""
     if not url or "baidu.com/link?url=" not in url:
@@ -40,31 +79,9 @@ async def _parse_result(result_element, temp_page):
     """
     解析单个搜索结果元素，提取标题、链接、摘要和图片。
     """
-    title, href, body, image_url = "", "", "", ""
-
-    # 策略1: 匹配卡片式/特殊结果 (如 id="1")
-    title_element = await result_element.query_selector("h3.cosc-title a")
-    if title_element:
-        title = await title_element.text_content()
-        href = await title_element.get_attribute("href")
-        body_element = await result_element.query_selector(".summary_22rnB > span")
-        if body_element:
-            body = await body_element.text_content()
-    
-    # 策略2: 匹配常规搜索结果 (如 id="2", id="3")
-    if not title:
-        title_element = await result_element.query_selector("h3[class^='t'] a")
-        if title_element:
-            title = await title_element.text_content()
-            href = await title_element.get_attribute("href")
-        body_element = await result_element.query_selector(".c-abstract, .summary-text_560AW")
-        if body_element:
-            body = await body_element.text_content()
-
-    # 修正：直接从 <img> 标签的 src 属性获取图片链接
-    image_element = await result_element.query_selector("img.cos-image-body, img._img_14uts_11")
-    if image_element:
-        image_url = await image_element.get_attribute("src")
+    # 一次 evaluate 在浏览器端完成全部选择器查询，避免逐个元素往返 Chromium 进程
+    data = await result_element.evaluate(_EXTRACT_RESULT_JS)
+    title, href, body, image_url = data["title"], data["href"], data["body"], data["image_url"]
 
     # 尝试从链接解码完整标题
     if href:
@@ -74,11 +91,11 @@ async def _parse_result(result_element, temp_page):
 
     # 如果通过特定选择器仍未找到内容，启用通用后备方案
     if not body:
-        full_text = await result_element.text_content()
-        body = re.sub(r'\s+', ' ', full_text).strip()
+        full_text = data["full_text"]
+        body = _RE_WS.sub(' ', full_text).strip()
 
     # 清理摘要
-    body = re.sub(r'展开剩余\d+%内容', '', body).strip()
+    body = _RE_EXPAND.sub('', body).strip()
     
     # 异步解析真实链接
     if href and "baidu.com/link" in href:
@@ -100,7 +117,7 @@ async def _parse_result(result_element, temp_page):
             p_elements = await temp_page.query_selector_all("p")
             page_text = " ".join([await p.text_content() for p in p_elements])
             
-            cleaned_text = re.sub(r'\s+', ' ', page_text).strip()
+            cleaned_text = _RE_WS.sub(' ', page_text).strip()
             if len(cleaned_text) > len(body):
                 body = cleaned_text
 
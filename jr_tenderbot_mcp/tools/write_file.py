@@ -0,0 +1,20 @@
+import os
+from typing import Annotated
+from pydantic import Field
+from utils.file_util import get_safe_path
+
+def write_file_impl(
+    path: Annotated[str, Field(description="要写入的文件的路径。")],
+    content: Annotated[str, Field(description="要写入的完整文件内容。")]
+) -> str:
+    """将内容整体写入文件：文件不存在时创建，已存在时直接覆盖。"""
+    safe_path = get_safe_path(path)
+    try:
+        parent_dir = os.path.dirname(safe_path)
+        if parent_dir:
+            os.makedirs(parent_dir, exist_ok=True)
+        with open(safe_path, "w", encoding="utf-8", newline='') as f:
+            f.write(content)
+        return f"文件已成功写入: {path}"
+    except Exception as e:
+        return f"写入文件时发生错误: {e}"
@@ -1,12 +1,23 @@
 import os
 import re
+import time
 import socket
+import asyncio
 import ipaddress
 import urllib.parse
+from functools import lru_cache
 from pathlib import Path
 import httpx
 
 BASE_DIR = "mcp-file"
+# BASE_DIR 的绝对路径只计算一次
+_BASE_ABS = os.path.abspath(BASE_DIR)
+# 主机名 -> (过期时间, 是否私有 IP)，避免每次抓取都做一次 DNS 查询
+_DNS_CACHE = {}
+_DNS_CACHE_TTL = 300
+_DNS_CACHE_MAX_SIZE = 1024
+# calculate_flexible_replacement 滚动哈希的模数（梅森素数 2**61 - 1）
+_HASH_MOD = (1 << 61) - 1
 
 def get_runtime_subdir(name: str) -> Path:
     """在 BASE_DIR 下创建一个带时间戳的子目录，用于存放运行时文件"""
@@ -49,26 +60,63 @@ def download_to(directory: Path, url: str) -> Path:
     except httpx.RequestError as e:
         raise ConnectionError(f"下载文件时出错: {e}")
 
+@lru_cache(maxsize=4096)
+def _resolve(path: str) -> str:
+    """将相对 BASE_DIR 的路径解析为绝对路径并校验不越界；结果按路径缓存（服务运行期间不切换工作目录）。"""
+    safe_path = os.path.abspath(os.path.join(BASE_DIR, path))
+    if not safe_path.startswith(_BASE_ABS):
+        raise ValueError("不允许访问基础目录之外的路径")
+    return safe_path
+
 def get_safe_path(path: str) -> str:
     """获取安全的文件路径，防止目录遍历"""
     # 仅在路径不是URL时应用安全路径检查
     if not is_url(path):
-        full_path = os.path.join(BASE_DIR, path)
-        safe_path = os.path.abspath(full_path)
-        if not safe_path.startswith(os.path.abspath(BASE_DIR)):
-            raise ValueError("不允许访问基础目录之外的路径")
-        return safe_path
+        return _resolve(path)
     return path
 
+def _cached_is_private(hostname: str):
+    """返回缓存中未过期的私有 IP 判定结果，没有则返回 None。"""
+    entry = _DNS_CACHE.get(hostname)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+def _store_is_private(hostname: str, is_private: bool) -> None:
+    """写入私有 IP 判定结果；超出容量时淘汰最早写入的条目。"""
+    _DNS_CACHE.pop(hostname, None)
+    if len(_DNS_CACHE) >= _DNS_CACHE_MAX_SIZE:
+        _DNS_CACHE.pop(next(iter(_DNS_CACHE)))
+    _DNS_CACHE[hostname] = (time.monotonic() + _DNS_CACHE_TTL, is_private)
+
 def is_private_ip(hostname: str) -> bool:
     """检查给定的主机名是否解析为私有IP地址。"""
+    cached = _cached_is_private(hostname)
+    if cached is not None:
+        return cached
     try:
         ip_addr = socket.gethostbyname(hostname)
         ip = ipaddress.ip_address(ip_addr)
-        return ip.is_private
     except (socket.gaierror, ValueError):
         # 如果无法解析主机名或不是有效的IP地址，则假定为非私有
         return False
+    _store_is_private(hostname, ip.is_private)
+    return ip.is_private
+
+async def is_private_ip_async(hostname: str) -> bool:
+    """is_private_ip 的异步版本，使用事件循环的 getaddrinfo 解析，不阻塞事件循环。"""
+    cached = _cached_is_private(hostname)
+    if cached is not None:
+        return cached
+    try:
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(hostname, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+        ip = ipaddress.ip_address(infos[0][4][0])
+    except (socket.gaierror, ValueError, IndexError):
+        # 如果无法解析主机名或不是有效的IP地址，则假定为非私有
+        return False
+    _store_is_private(hostname, ip.is_private)
+    return ip.is_private
 
 def convert_to_raw_github_url(url: str) -> str:
     """如果URL是GitHub blob链接，则将其转换为raw.githubusercontent.com链接。"""
@@ -85,13 +133,24 @@ def calculate_flexible_replacement(current_content: str, old_string: str, new_st
         return None, 0
 
     search_lines_stripped = [line.strip() for line in search_lines]
-    
+    # 源文件每行只 strip 一次，窗口比较直接切片
+    source_stripped = [line.strip() for line in source_lines]
+    window_size = len(search_lines)
+
+    # 滚动哈希：窗口哈希为各行哈希之和，滑动时增量更新；哈希相等时再逐行核对
+    line_hashes = [hash(line) for line in source_stripped]
+    search_hash = sum(hash(line) for line in search_lines_stripped) % _HASH_MOD
+    window_hash = sum(line_hashes[:window_size]) % _HASH_MOD
+
     match_indices = []
-    for i in range(len(source_lines) - len(search_lines) + 1):
-        window = source_lines[i : i + len(search_lines)]
-        window_stripped = [line.strip() for line in window]
-        if window_stripped == search_lines_stripped:
+    for i in range(len(source_lines) - window_size + 1):
+        if i:
+            window_hash = (window_hash + line_hashes[i + window_size - 1] - line_hashes[i - 1]) % _HASH_MOD
+        if window_hash == search_hash and source_stripped[i : i + window_size] == search_lines_stripped:
             match_indices.append(i)
+            if len(match_indices) > 1:
+                # 已确定不唯一，无需继续扫描
+                break
 
     if len(match_indices) != 1:
         return None, len(match_indices)
@@ -1,10 +1,13 @@
 import asyncio
 import re
 import os
-import json
 import random
+import time
+from collections import defaultdict
+from functools import lru_cache
 from typing import List, Dict, Any, Callable
 import tiktoken
+import orjson
 import uuid
 import docx
 from docx.oxml.text.paragraph import CT_P
@@ -43,7 +46,18 @@ from tender_analysis.analysis_agents import (
 DEFAULT_DOCX_PATH = "/Users/cris/Documents/JR/Agent_py/TenderBot_New/jr_tenderbot_mcp/mcp-file/data/【中国上市公司协会】标书251127.converted.docx"
 DEFAULT_MODEL_NAME = "gpt-4.1-mini"
 MAX_TOKENS_PER_CHUNK = 45000  # 用于文本分块的 Token 阈值
-SUMMARY_INPUT_CHAR_LIMIT = 20000  # 项目概要阶段输入截断阈值
+MAX_SUMMARY_TOKENS = 6000  # 项目概要阶段输入截断阈值（按 token 计）
+MAX_CONCURRENT_LLM_CALLS = 8  # 按文本块并发调用 LLM 时的并发上限，避免触发速率限制
+TOKEN_DELTA_FLUSH_CHARS = 256  # token_delta 攒批推送的字符阈值
+TOKEN_DELTA_FLUSH_INTERVAL = 0.05  # token_delta 攒批推送的时间阈值（秒）
+# 表格首尾标记，由 convert_docx_to_markdown 写入，chunk_content 据此保持表格完整
+_TABLE_START_PREFIX = "<!-- TABLE_START:"
+_TABLE_END_MARK = "<!-- TABLE_END -->"
+# LLM 输出中的 JSON 片段：```json 代码块，或不带代码块的最外层数组/对象
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```|(\[.*\]|\{.*\})", re.DOTALL)
+_JSON_START_RE = re.compile(r"\s*[\[{]")
+# 章节标题（如“第一章 总则”）；直接匹配原始行，首尾空白由模式自身容忍，等价于对 strip() 后的行匹配
+_TITLE_RE = re.compile(r"^\s*#*\s*第[一二三四五六七八九十百]+章\s+[^\t.]*[^\s.]\s*$")
 
 # 定义了所有中间及最终产出文件的标准文件名
 OUTPUT_PATHS = {
@@ -68,8 +82,8 @@ OUTPUT_PATHS = {
 #       - 将输入的 .docx 文件转换为 Markdown 格式。
 #       - 对 Markdown 文本进行结构分析和智能分块。
 #
-#   阶段 2-5: 并行/串行分析 (Parallel/Serial Analysis)
-#       - 并行或串行地调用四个独立的 Agent（商务、技术、报价、评分）。
+#   阶段 2-5: 并行分析 (Parallel Analysis)
+#       - 并发地调用四个独立的 Agent（商务、技术、报价、评分）。
 #       - 每个 Agent 负责从文本块中提取其专业领域的内容。
 #
 #   阶段 6: 模版提取 (Template Extraction)
@@ -89,15 +103,40 @@ OUTPUT_PATHS = {
 # ----------------- 文档处理逻辑 (升级分块能力 + 本地 Docx 解析) -----------------
 
 # --- 核心改动：从 document_processor.py 搬运并整合 Docx 解析逻辑 ---
-def _table_to_markdown(table: docx.table.Table) -> str:
-    """将 docx.table.Table 对象转换为 Markdown 格式的字符串。"""
+_WS_RE = re.compile(r"\s+")
+
+def _iter_row_cell_texts(tbl: CT_Tbl):
+    """
+    直接遍历表格 XML，逐行产出各单元格文本列表，不创建 Row/_Cell 包装对象。
+    与 python-docx 的 row.cells 语义一致：横向合并（gridSpan）的单元格按跨列数重复，
+    纵向合并的延续单元格（vMerge="continue"）取上方起始单元格的文本。
+    """
+    above: Dict[int, str] = {}  # 上一行各网格列对应的单元格文本
+    for tr in tbl.tr_lst:
+        row_texts: List[str] = []
+        current: Dict[int, str] = {}
+        grid_offset = tr.grid_before
+        for tc in tr.tc_lst:
+            span = tc.grid_span
+            if tc.vMerge == "continue":
+                text = above.get(grid_offset, "")
+            else:
+                text = "\n".join(p.text for p in tc.p_lst)
+            for col in range(grid_offset, grid_offset + span):
+                current[col] = text
+            row_texts.extend([text] * span)
+            grid_offset += span
+        above = current
+        yield row_texts
+
+def _table_to_markdown(tbl: CT_Tbl) -> str:
+    """将表格的 CT_Tbl 元素转换为 Markdown 格式的字符串。"""
     md_table = []
-    for i, row in enumerate(table.rows):
-        cell_texts = [" ".join(cell.text.split()).strip() for cell in row.cells]
+    for i, raw_texts in enumerate(_iter_row_cell_texts(tbl)):
+        cell_texts = [_WS_RE.sub(" ", text).strip() for text in raw_texts]
         md_table.append("| " + " | ".join(cell_texts) + " |")
         if i == 0:
-            separator = ["---" for _ in row.cells]
-            md_table.append("| " + " | ".join(separator) + " |")
+            md_table.append("| " + " | ".join(["---"] * len(cell_texts)) + " |")
     return "\n".join(md_table)
 
 def convert_docx_to_markdown(docx_path: str) -> str:
@@ -106,39 +145,98 @@ def convert_docx_to_markdown(docx_path: str) -> str:
     """
     document = docx.Document(docx_path)
     text_lines = []
+    table_index = 0
 
+    # 直接读取底层 XML 元素的文本，不为每个段落/表格构造 Paragraph/Table 包装对象
     for element in document.element.body:
         if isinstance(element, CT_P):
-            para = docx.text.paragraph.Paragraph(element, document)
-            text_lines.append(para.text)
+            text_lines.append(element.text)
         elif isinstance(element, CT_Tbl):
-            table = docx.table.Table(element, document)
-            md_table_str = _table_to_markdown(table)
-            text_lines.append("\n" + md_table_str + "\n")
+            md_table_str = _table_to_markdown(element)
+            # 用注释标记包裹表格，分块时据此把整张表当作一个不可拆分的段落
+            text_lines.append(f"\n{_TABLE_START_PREFIX}id={table_index} -->\n{md_table_str}\n{_TABLE_END_MARK}\n")
+            table_index += 1
 
     return "\n".join(text_lines)
 
 
+@lru_cache(maxsize=4)
+def _get_encoder(name: str = "cl100k_base") -> tiktoken.Encoding:
+    """返回缓存的 tiktoken 编码器，BPE 表只在首次调用时加载。"""
+    return tiktoken.get_encoding(name)
+
 def get_token_count(text: str) -> int:
-    """使用 tiktoken 计算文本的 token 数量。"""
-    encoder = tiktoken.get_encoding("cl100k_base")
-    return len(encoder.encode(text))
+    """使用 tiktoken 计算文本的 token 数量（按普通文本编码，文中的特殊 token 字面量不会引发异常）。"""
+    return len(_get_encoder().encode_ordinary(text))
+
+def truncate_to_tokens(text: str, max_tokens: int) -> tuple[str, bool]:
+    """按 token 数截断文本，返回 (截断后的文本, 是否发生截断)。"""
+    encoder = _get_encoder()
+    tokens = encoder.encode_ordinary(text)
+    if len(tokens) <= max_tokens:
+        return text, False
+    return encoder.decode(tokens[:max_tokens]), True
 
 def analyze_structure(text: str) -> List[Dict[str, Any]]:
     # (内容与之前一致, 为了简洁性在此折叠)
     lines = text.split('\n')
-    title_pattern = re.compile(r"^\s*#*\s*第[一二三四五六七八九十百]+章\s+[^\t\.]*$")
-    found_titles = [{"title": line.strip('# ').strip(), "line_num": i} for i, line in enumerate(lines) if title_pattern.match(line.strip())]
+    found_titles = [{"title": line.strip('# ').strip(), "line_num": i} for i, line in enumerate(lines) if _TITLE_RE.match(line)]
     structure = []
     for i, title_info in enumerate(found_titles):
         start_line = title_info["line_num"]
         end_line = found_titles[i+1]["line_num"] if i + 1 < len(found_titles) else len(lines)
-        content_preview = "".join(lines[start_line+1:end_line]).strip()
-        if content_preview:
+        # 只判断标题下是否有非空行，遇到第一行非空内容即停止，不拼接整段文本
+        if any(lines[j].strip() for j in range(start_line + 1, end_line)):
             structure.append({"title": title_info["title"], "text": "\n".join(lines[start_line:end_line]).strip()})
     if not structure: return [{"title": "完整文档", "text": text}]
     return structure
 
+def _split_table_block(block: List[str], lens: List[int]) -> List[tuple]:
+    """
+    将一个表格块（含首尾标记行）转换为分块单元。
+    整表不超过 MAX_TOKENS_PER_CHUNK 时作为一个单元；否则按行拆分，每段都重复表头与分隔行。
+    """
+    total = sum(lens)
+    if total <= MAX_TOKENS_PER_CHUNK or len(block) <= 4:
+        return [("\n".join(block), total, True)]
+
+    tail_size = 1 if block[-1].strip() == _TABLE_END_MARK else 0
+    head, head_lens = block[:3], lens[:3]  # 起始标记 + 表头行 + 分隔行
+    tail, tail_lens = block[len(block) - tail_size:], lens[len(block) - tail_size:]
+    fixed_tokens = sum(head_lens) + sum(tail_lens)
+
+    units = []
+    rows: List[str] = []
+    rows_tokens = fixed_tokens
+    for row, row_tokens in zip(block[3:len(block) - tail_size], lens[3:len(block) - tail_size]):
+        if rows and rows_tokens + row_tokens > MAX_TOKENS_PER_CHUNK:
+            units.append(("\n".join(head + rows + tail), rows_tokens, True))
+            rows, rows_tokens = [], fixed_tokens
+        rows.append(row)
+        rows_tokens += row_tokens
+    if rows:
+        units.append(("\n".join(head + rows + tail), rows_tokens, True))
+    return units
+
+def _build_chunk_units(paragraphs: List[str], para_lens: List[int]) -> List[tuple]:
+    """
+    把段落列表合并为分块单元 (文本, token 数, 是否表格)。
+    TABLE_START 到 TABLE_END 之间的所有行视为一个整体，其余段落各自成为一个单元。
+    """
+    units = []
+    i, n = 0, len(paragraphs)
+    while i < n:
+        if paragraphs[i].lstrip().startswith(_TABLE_START_PREFIX):
+            j = i + 1
+            while j < n and paragraphs[j].strip() != _TABLE_END_MARK:
+                j += 1
+            units.extend(_split_table_block(paragraphs[i:j + 1], para_lens[i:j + 1]))
+            i = j + 1
+        else:
+            units.append((paragraphs[i], para_lens[i], False))
+            i += 1
+    return units
+
 def chunk_content(sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     将章节文本分割成适合模型处理的块。
@@ -162,25 +260,33 @@ def chunk_content(sections: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             print(f"   - 检测到超长块 (标题: '{section['title']}', Tokens: {token_count})，正在进行子分块...")
             
             sub_chunks_text = []
-            current_sub_chunk_paras = []
+            current_sub_chunk_units = [] # (文本, token 数, 是否表格)
             current_token_count = 0
             
             paragraphs = [p for p in section_text.split('\n') if p.strip()]
+            # 一次批量编码所有段落（tiktoken 在 Rust 侧并行处理），避免逐段跨语言调用
+            para_tokens = _get_encoder().encode_ordinary_batch(paragraphs, num_threads=os.cpu_count() or 1)
+            para_lens = [len(tokens) + 1 for tokens in para_tokens] # +1 for newline token
 
-            for para in paragraphs:
-                para_token_count = get_token_count(para) + 1 # +1 for newline token
+            # 表格整体作为一个单元参与分块，避免被切散到不同子块
+            for unit in _build_chunk_units(paragraphs, para_lens):
+                unit_token_count = unit[1]
                 
-                if current_token_count + para_token_count > MAX_TOKENS_PER_CHUNK and current_sub_chunk_paras:
-                    sub_chunks_text.append("\n".join(current_sub_chunk_paras))
-                    overlap_paras = current_sub_chunk_paras[-OVERLAP_PARA_COUNT:]
-                    current_sub_chunk_paras = overlap_paras
-                    current_token_count = get_token_count("\n".join(current_sub_chunk_paras))
-
-                current_sub_chunk_paras.append(para)
-                current_token_count += para_token_count
+                if current_token_count + unit_token_count > MAX_TOKENS_PER_CHUNK and current_sub_chunk_units:
+                    sub_chunks_text.append("\n".join(u[0] for u in current_sub_chunk_units))
+                    # 重叠只携带最后一个表格单元之后的普通段落，表格不重复带入下一子块；token 数已知，直接求和
+                    overlap_units = current_sub_chunk_units[-OVERLAP_PARA_COUNT:]
+                    table_positions = [k for k, u in enumerate(overlap_units) if u[2]]
+                    if table_positions:
+                        overlap_units = overlap_units[table_positions[-1] + 1:]
+                    current_sub_chunk_units = overlap_units
+                    current_token_count = sum(u[1] for u in current_sub_chunk_units)
+
+                current_sub_chunk_units.append(unit)
+                current_token_count += unit_token_count
             
-            if current_sub_chunk_paras:
-                sub_chunks_text.append("\n".join(current_sub_chunk_paras))
+            if current_sub_chunk_units:
+                sub_chunks_text.append("\n".join(u[0] for u in current_sub_chunk_units))
 
             # 将子块列表转换为最终的 chunk 字典
             for sub_chunk_text in sub_chunks_text:
@@ -206,81 +312,102 @@ async def run_phase_and_collect_artifacts(phase_stream):
         phase_stream: 一个 `run_extraction_phase` 函数返回的异步生成器。
 
     Returns:
-        List[str]: 一个只包含最终产物事件的列表。
+        List[bytes]: 一个只包含最终产物事件的列表。
     """
     final_events = []
     async for event in phase_stream:
         # 我们必须遍历整个流，以确保 run_extraction_phase 的代码被完整执行
-        if event.startswith("event: artifact"):
+        if event.startswith(b"event: artifact\n"):
             final_events.append(event)
     return final_events
 
 
+# 阶段事件流结束的哨兵
+_PHASE_DONE = object()
+
+async def pump_phase_events(phase_stream, queue: asyncio.Queue):
+    """
+    把一个分析阶段（`run_extraction_phase`）产出的所有事件原样放入共享队列，
+    结束（包括异常结束）时放入 `_PHASE_DONE` 哨兵。多个阶段可借此并发运行，
+    同时由 `event_generator` 按到达顺序实时转发全部事件。
+    """
+    try:
+        async for event in phase_stream:
+            await queue.put(event)
+    finally:
+        await queue.put(_PHASE_DONE)
+
+
 # ----------------- 核心业务编排逻辑 (重构成多阶段) -----------------
 
-def sse(event: str, data_obj: Dict) -> str:
+# 事件头（"event: xxx\ndata: "）按事件类型缓存，每种事件只编码一次
+_SSE_EVENT_HEADERS: Dict[str, bytes] = {}
+
+def sse(event: str, data_obj: Dict) -> bytes:
     """
-    将事件类型和数据对象，格式化为符合 Server-Sent Events (SSE) 规范的字符串。
+    将事件类型和数据对象，格式化为符合 Server-Sent Events (SSE) 规范的字节块。
 
     Args:
         event (str): 事件的类型 (e.g., "log", "artifact", "phase_start")。
-        data_obj (Dict): 要发送的数据，将被序列化为 JSON 字符串。
+        data_obj (Dict): 要发送的数据，将被 orjson 序列化为 JSON。
 
     Returns:
-        str: 一个可以直接发送给客户端的 SSE 格式的文本块。
+        bytes: 一个可以直接发送给客户端的 SSE 格式的字节块（UTF-8）。
     """
-    return f"event: {event}\n" + f"data: {json.dumps(data_obj, ensure_ascii=False, default=str)}\n\n"
+    header = _SSE_EVENT_HEADERS.get(event)
+    if header is None:
+        header = _SSE_EVENT_HEADERS[event] = f"event: {event}\ndata: ".encode()
+    return header + orjson.dumps(data_obj, default=str, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
 
-async def mcp_smart_write(mcp_client: MCPClient, file_path: str, content: str) -> bool:
+async def mcp_smart_write(mcp_client: MCPClient, file_path: str, content: str | bytes) -> bool:
     """
     通过 MCP 服务，以一种健壮的方式写入或覆盖文件内容。
 
-    它会自动处理文件是否存在的情况，确保内容能被正确写入。
+    优先调用 write_file 直接整体覆盖，以其返回状态作为结果，无需先读取原文件、
+    也无需写入后轮询校验；write_file 调用本身失败（如服务端不支持）时，
+    回退为读取原内容后用 smart_edit 替换。
 
     Args:
         mcp_client (MCPClient): 已初始化的 MCP 客户端实例。
         file_path (str): 目标文件的路径（相对于 MCP 服务的工作目录）。
-        content (str): 要写入的完整文件内容。
+        content (str | bytes): 要写入的完整文件内容；bytes 视为 UTF-8 编码（如 orjson 的输出）。
 
     Returns:
         bool: 写入操作是否成功。
     """
+    if isinstance(content, bytes):
+        # MCP 工具参数经 JSON 传输，只能是字符串
+        content = content.decode("utf-8")
+
     try:
-        old_text = ""
-        file_exists = False
-        try:
-            read_res = await mcp_client.call_tool("read_file", {"path": file_path, "limit": 10000000})
-            text_from_read = str(getattr(read_res, "data", read_res))
-            if "文件未找到" not in text_from_read and "file not found" not in text_from_read.lower():
-                file_exists = True
-                old_text = text_from_read
-        except Exception:
-            file_exists = False
-
-        if not file_exists or old_text == "":
-            # --- 核心改动：使用 smart_edit 来实现 write_file 的功能 ---
-            await mcp_client.call_tool("smart_edit", {
-                "file_path": file_path, 
-                "old_string": "", 
-                "new_string": content
-            })
-        else:
-            await mcp_client.call_tool("smart_edit", {
-                "file_path": file_path, 
-                "old_string": old_text, 
-                "new_string": content
-            })
-        
-        # 写入后校验
-        for i in range(3): # 简化校验次数
-            await asyncio.sleep(0.1 * (i + 1))
-            val_res = await mcp_client.call_tool("read_file", {"path": file_path, "limit": 1})
-            if "文件未找到" not in str(getattr(val_res, "data", val_res)):
-                return True
-        return False
+        write_res = await mcp_client.call_tool("write_file", {"path": file_path, "content": content})
+    except Exception:
+        write_res = None
+
+    if write_res is not None:
+        # write_file 返回的错误信息（如 "写入文件时发生错误"）视为写入失败
+        return "文件已成功写入" in str(getattr(write_res, "data", write_res))
+
+    try:
+        # 回退：文件存在时用全部原内容作为 old_string 替换，不存在时直接创建
+        old_text = await mcp_read_file(mcp_client, file_path) or ""
+        edit_res = await mcp_client.call_tool("smart_edit", {
+            "file_path": file_path, 
+            "old_string": old_text, 
+            "new_string": content
+        })
+        return "成功" in str(getattr(edit_res, "data", edit_res))
     except Exception:
         return False
 
+# 所有按文本块并发的 LLM 调用共用同一个并发上限
+_LLM_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+
+async def run_agent_limited(agent: Agent, prompt: str, run_config: RunConfig):
+    """在全局并发上限内执行一次非流式的 Agent 调用。"""
+    async with _LLM_SEMAPHORE:
+        return await Runner.run(agent, prompt, run_config=run_config)
+
 async def run_extraction_phase(
     phase_name: str,
     phase_key: str, # <-- 核心改动：增加一个专门用于查找的 key
@@ -289,44 +416,94 @@ async def run_extraction_phase(
     run_config: RunConfig,
     mcp_client: MCPClient,
     language: str = "zh",
+    stream_tokens: bool = True,
 ):
     """
     一个通用的辅助函数，用于执行单个提取阶段（例如商务、技术等）。
-    它会遍历文本块，流式调用 Agent，并实时推送事件，最终将结果写入文件。
+    stream_tokens 为 True 时逐块流式调用 Agent 并实时推送 token；为 False 时
+    所有文本块并发调用（受 MAX_CONCURRENT_LLM_CALLS 限制），每完成一块推送一次进度。
+    最终按文本块顺序汇总结果并写入文件。
     """
     yield sse("phase_start", {"name": phase_name})
     
     agent = agent_factory(language=language)
     full_extracted_content = ""
-    
-    for i, chunk_info in enumerate(text_chunks_with_meta):
-        chunk_text = chunk_info['content']
-        yield sse("update", {"phase": phase_name, "progress": f"{i+1}/{len(text_chunks_with_meta)}"})
+    total_chunks = len(text_chunks_with_meta)
+
+    if not stream_tokens:
+        async def run_chunk(index: int, chunk_text: str):
+            result = await run_agent_limited(
+                agent, f"请从以下文本中提取 {phase_name}：\n\n---\n\n{chunk_text}", run_config
+            )
+            return index, result.final_output or ""
+
+        tasks = [
+            asyncio.create_task(run_chunk(i, chunk_info['content']))
+            for i, chunk_info in enumerate(text_chunks_with_meta)
+        ]
+        extracted_chunks = [""] * total_chunks
+        try:
+            # 按完成顺序推送进度，结果按块序号归位
+            for finished, next_done in enumerate(asyncio.as_completed(tasks), 1):
+                i, extracted_content_chunk = await next_done
+                extracted_chunks[i] = extracted_content_chunk
+                yield sse("update", {"phase": phase_name, "progress": f"{finished}/{total_chunks}"})
+                if extracted_content_chunk and "未找到" not in extracted_content_chunk:
+                    yield sse("note", {"phase": phase_name, "text": f"块 {i+1} 分析完成，提取到内容。"})
+                else:
+                    yield sse("note", {"phase": phase_name, "text": f"块 {i+1} 分析完成，未找到相关内容。"})
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        for chunk_info, extracted_content_chunk in zip(text_chunks_with_meta, extracted_chunks):
+            if extracted_content_chunk and "未找到" not in extracted_content_chunk:
+                source_title = chunk_info['source_title']
+                full_extracted_content += f"## 来自章节: {source_title}\n\n{extracted_content_chunk}\n\n---\n\n"
+    else:
+        for i, chunk_info in enumerate(text_chunks_with_meta):
+            chunk_text = chunk_info['content']
+            yield sse("update", {"phase": phase_name, "progress": f"{i+1}/{total_chunks}"})
         
-        yield sse("stream_start", {"chunk": i + 1, "phase": phase_name})
+            yield sse("stream_start", {"chunk": i + 1, "phase": phase_name})
         
-        result_stream = Runner.run_streamed(
-            agent, 
-            f"请从以下文本中提取 {phase_name}：\n\n---\n\n{chunk_text}", 
-            run_config=run_config
-        )
+            result_stream = Runner.run_streamed(
+                agent, 
+                f"请从以下文本中提取 {phase_name}：\n\n---\n\n{chunk_text}", 
+                run_config=run_config
+            )
         
-        extracted_content_chunk = ""
-        async for event in result_stream.stream_events():
-            if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
-                delta = event.data.delta
-                extracted_content_chunk += delta
-                yield sse("token_delta", {"delta": delta})
-
-        yield sse("stream_end", {"chunk": i + 1, "phase": phase_name})
+            extracted_content_chunk = ""
+            # 攒批推送 token 增量：累计达到字符阈值或距上次推送超过时间阈值时才发一帧
+            pending_deltas: List[str] = []
+            pending_chars = 0
+            last_flush = time.monotonic()
+            async for event in result_stream.stream_events():
+                if event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                    delta = event.data.delta
+                    extracted_content_chunk += delta
+                    pending_deltas.append(delta)
+                    pending_chars += len(delta)
+                    now = time.monotonic()
+                    if pending_chars >= TOKEN_DELTA_FLUSH_CHARS or now - last_flush >= TOKEN_DELTA_FLUSH_INTERVAL:
+                        yield sse("token_delta", {"phase": phase_name, "delta": "".join(pending_deltas)})
+                        pending_deltas.clear()
+                        pending_chars = 0
+                        last_flush = now
+
+            # 流结束前推送剩余的增量
+            if pending_deltas:
+                yield sse("token_delta", {"phase": phase_name, "delta": "".join(pending_deltas)})
+            yield sse("stream_end", {"chunk": i + 1, "phase": phase_name})
         
-        if extracted_content_chunk and "未找到" not in extracted_content_chunk:
-            source_title = chunk_info['source_title']
-            new_section = f"## 来自章节: {source_title}\n\n{extracted_content_chunk}\n\n---\n\n"
-            full_extracted_content += new_section
-            yield sse("note", {"phase": phase_name, "text": f"块 {i+1} 分析完成，提取到内容。"})
-        else:
-            yield sse("note", {"phase": phase_name, "text": f"块 {i+1} 分析完成，未找到相关内容。"})
+            if extracted_content_chunk and "未找到" not in extracted_content_chunk:
+                source_title = chunk_info['source_title']
+                new_section = f"## 来自章节: {source_title}\n\n{extracted_content_chunk}\n\n---\n\n"
+                full_extracted_content += new_section
+                yield sse("note", {"phase": phase_name, "text": f"块 {i+1} 分析完成，提取到内容。"})
+            else:
+                yield sse("note", {"phase": phase_name, "text": f"块 {i+1} 分析完成，未找到相关内容。"})
     
     # --- 核心改动：使用新的 phase_key 来查找文件名 ---
     output_filename = OUTPUT_PATHS[phase_key]
@@ -375,6 +552,26 @@ def split_outline_by_headings(outline_text: str) -> Dict[str, str]:
         
     return sections
 
+def _parse_llm_json(text: str | None) -> Any:
+    """
+    从 LLM 输出中解析 JSON：优先取 ```json 代码块中的内容，否则取最外层的 [...] 或 {...}。
+
+    Raises:
+        ValueError: 输出为空、找不到 JSON 片段或 JSON 不合法（orjson.JSONDecodeError 是其子类）。
+    """
+    if not text:
+        raise ValueError("模型输出为空")
+    if _JSON_START_RE.match(text):
+        # 输出本身就是 JSON（orjson 允许首尾空白）时直接解析，不做任何切片或拷贝
+        try:
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            pass
+    match = _JSON_BLOCK_RE.search(text)
+    if match is None:
+        raise ValueError("模型输出中未找到 JSON")
+    return orjson.loads(match.group(1) if match.group(1) is not None else match.group(2))
+
 async def mcp_read_file(mcp_client: MCPClient, file_path: str) -> str | None:
     """
     通过 MCP 服务，以一种健壮的方式读取文件内容。
@@ -412,11 +609,11 @@ async def event_generator(
         model_name (str): 用于执行任务的 LLM 模型名称。
         language (str): Agent 输出内容的语言。
         stream_token_deltas (bool): 控制分析阶段（2-5）的执行模式。
-                                    True  -> 串行执行，并实时推送所有 token 流。
+                                    True  -> 并发执行，并实时推送所有 token 流（按 phase 区分）。
                                     False -> 并行执行，只实时推送一个随机任务的 token 流。
 
     Yields:
-        str: 格式化后的 SSE 事件字符串。
+        bytes: 编码后的 SSE 事件帧。
     """
     # 1. 初始化
     litellm_model = LitellmModel(model=model_name, api_key=settings.OPENAI_API_KEY)
@@ -424,89 +621,114 @@ async def event_generator(
         model=litellm_model, model_settings=ModelSettings(include_usage=False), tracing_disabled=True
     )
     mcp_client = MCPClient(settings.MCP_SERVER_URL)
+    # 在后台进行的 MCP 写入/读取任务；无论流水线如何结束，都在关闭会话前统一收尾
+    write_tasks: List[asyncio.Task] = []
+    read_tasks: List[asyncio.Task] = []
     
-    try:
-        # --- 阶段 1: 文档预处理 ---
-        yield sse("phase_start", {"name": "文档预处理"})
-        yield sse("note", {"phase": "文档预处理", "text": f"正在读取并转换文档: {os.path.basename(docx_path)}..."})
-        
-        # --- 核心改动：替换 MCP 调用为本地函数调用 ---
+    # 整条流水线共用一个 MCP 会话，避免每次读写都重新建立连接
+    async with mcp_client:
         try:
-            markdown_content = convert_docx_to_markdown(docx_path)
-            yield sse("note", {"phase": "文档预处理", "text": "文档转换成功！"})
-        except Exception as e:
-            yield sse("error", {"type": "DocxConversionError", "message": f"处理 Docx 文件时出错: {e}"})
-            return
-
-        # --- 核心改动：保存并推送 Markdown 全文 ---
-        async with mcp_client:
-            await mcp_smart_write(mcp_client, OUTPUT_PATHS["intermediate_md"], markdown_content)
-        yield sse("artifact", {"type": "file", "filename": OUTPUT_PATHS["intermediate_md"]})
-
-        # --- 新阶段：项目概要生成 ---
-        yield sse("phase_start", {"name": "项目概要生成"})
-        yield sse("note", {"phase": "项目概要生成", "text": "正在调用 LLM 生成项目概要描述..."})
-        summary_agent = project_summary_agent(language=language)
-        summary_input_text = markdown_content
-        truncated = False
-        if len(summary_input_text) > SUMMARY_INPUT_CHAR_LIMIT:
-            summary_input_text = summary_input_text[:SUMMARY_INPUT_CHAR_LIMIT]
-            truncated = True
-        summary_prompt = (
-            "请根据以下招标文件（Markdown 形式）的内容，输出符合指令要求的项目概要：\n\n"
-            f"{summary_input_text}"
-        )
-        summary_result = await Runner.run(summary_agent, summary_prompt, run_config=run_config)
-        summary_text = summary_result.final_output.strip()
-        if not summary_text:
-            summary_text = "（模型未生成有效内容）"
-        metadata_notice = (
-            "" if truncated else ""
-        )
-        project_summary_md = f"# 招标项目概要\n\n{summary_text}{metadata_notice}\n"
-        async with mcp_client:
-            await mcp_smart_write(
+            # --- 阶段 1: 文档预处理 ---
+            yield sse("phase_start", {"name": "文档预处理"})
+            yield sse("note", {"phase": "文档预处理", "text": f"正在读取并转换文档: {os.path.basename(docx_path)}..."})
+        
+            # --- 核心改动：替换 MCP 调用为本地函数调用（放入线程执行，避免阻塞事件循环） ---
+            try:
+                markdown_content = await asyncio.to_thread(convert_docx_to_markdown, docx_path)
+                yield sse("note", {"phase": "文档预处理", "text": "文档转换成功！"})
+            except Exception as e:
+                yield sse("error", {"type": "DocxConversionError", "message": f"处理 Docx 文件时出错: {e}"})
+                return
+
+            # --- 核心改动：保存 Markdown 全文（后台写入，与后续步骤并发，完成后统一推送产物） ---
+            md_write = asyncio.create_task(mcp_smart_write(mcp_client, OUTPUT_PATHS["intermediate_md"], markdown_content))
+            write_tasks.append(md_write)
+
+            # --- 新阶段：项目概要生成 ---
+            yield sse("phase_start", {"name": "项目概要生成"})
+            yield sse("note", {"phase": "项目概要生成", "text": "正在调用 LLM 生成项目概要描述..."})
+            summary_agent = project_summary_agent(language=language)
+            summary_input_text, truncated = await asyncio.to_thread(
+                truncate_to_tokens, markdown_content, MAX_SUMMARY_TOKENS
+            )
+            summary_prompt = (
+                "请根据以下招标文件（Markdown 形式）的内容，输出符合指令要求的项目概要：\n\n"
+                f"{summary_input_text}"
+            )
+            summary_result = await Runner.run(summary_agent, summary_prompt, run_config=run_config)
+            summary_text = summary_result.final_output.strip()
+            if not summary_text:
+                summary_text = "（模型未生成有效内容）"
+            metadata_notice = (
+                "" if truncated else ""
+            )
+            project_summary_md = f"# 招标项目概要\n\n{summary_text}{metadata_notice}\n"
+            summary_write = asyncio.create_task(mcp_smart_write(
                 mcp_client,
                 OUTPUT_PATHS["project_summary"],
                 project_summary_md,
+            ))
+            write_tasks.append(summary_write)
+            yield sse("phase_end", {"name": "项目概要生成"})
+
+
+            yield sse("note", {"phase": "文档预处理", "text": "正在分析文档结构并进行文本分块..."})
+            # 结构分析与分块均为 CPU 密集型操作，同样放入线程执行
+            sections = await asyncio.to_thread(analyze_structure, markdown_content)
+            final_chunks_with_meta = await asyncio.to_thread(chunk_content, sections)
+            text_chunks = [chunk['content'] for chunk in final_chunks_with_meta] # 提取纯文本内容列表
+            yield sse("note", {"phase": "文档预处理", "text": f"文档分块完成，共生成 {len(text_chunks)} 个文本块。"})
+
+            # --- 核心改动：保存并推送分块结果（NDJSON：每行一个分块，逐块序列化，可按行增量读取） ---
+            chunks_json_content = b"\n".join(
+                orjson.dumps(chunk, option=orjson.OPT_NON_STR_KEYS) for chunk in final_chunks_with_meta
             )
-        yield sse("artifact", {"type": "file", "filename": OUTPUT_PATHS["project_summary"]})
-        yield sse("phase_end", {"name": "项目概要生成"})
-
-
-        yield sse("note", {"phase": "文档预处理", "text": "正在分析文档结构并进行文本分块..."})
-        sections = analyze_structure(markdown_content)
-        final_chunks_with_meta = chunk_content(sections)
-        text_chunks = [chunk['content'] for chunk in final_chunks_with_meta] # 提取纯文本内容列表
-        yield sse("note", {"phase": "文档预处理", "text": f"文档分块完成，共生成 {len(text_chunks)} 个文本块。"})
-
-        # --- 核心改动：保存并推送分块结果 ---
-        chunks_json_content = json.dumps(
-            final_chunks_with_meta,
-            ensure_ascii=False,
-            indent=2
-        )
-        async with mcp_client:
-            await mcp_smart_write(mcp_client, OUTPUT_PATHS["intermediate_chunks"], chunks_json_content)
-        yield sse("artifact", {"type": "file", "filename": OUTPUT_PATHS["intermediate_chunks"]})
-        yield sse("phase_end", {"name": "文档预处理"})
-
-        # --- 阶段 2-5: 顺序执行各项提取 ---
-        # --- 核心改动：根据 stream_token_deltas 的值，选择执行模式 ---
-        if stream_token_deltas:
-            # --- 模式一：串行执行，实时推送 Token 流 (便于调试) ---
-            yield sse("note", {"phase": "分析", "text": "以串行模式启动分析，将实时推送 Token 流..."})
-            async with mcp_client:
-                async for event in run_extraction_phase("商务要求", "business", business_requirement_extractor_agent, final_chunks_with_meta, run_config, mcp_client, language): yield event
-                async for event in run_extraction_phase("技术要求", "technical", technical_requirement_extractor_agent, final_chunks_with_meta, run_config, mcp_client, language): yield event
-                async for event in run_extraction_phase("报价要求", "pricing", pricing_requirement_extractor_agent, final_chunks_with_meta, run_config, mcp_client, language): yield event
-                async for event in run_extraction_phase("评分要求", "scoring", scoring_requirement_extractor_agent, final_chunks_with_meta, run_config, mcp_client, language): yield event
-        else:
-            # --- 模式三：并行执行，但实时推送一个任务的流 (兼顾效率与反馈) ---
-            yield sse("phase_start", {"name": "并行分析"})
-            yield sse("note", {"phase": "并行分析", "text": "以并行模式启动分析，将实时推送其中一个任务的进度流..."})
+            chunks_write = asyncio.create_task(mcp_smart_write(mcp_client, OUTPUT_PATHS["intermediate_chunks"], chunks_json_content))
+            write_tasks.append(chunks_write)
+
+            # 三份预处理产物相互独立，等待并发写入全部完成后再推送
+            await asyncio.gather(md_write, summary_write, chunks_write)
+            for key in ("intermediate_md", "project_summary", "intermediate_chunks"):
+                yield sse("artifact", {"type": "file", "filename": OUTPUT_PATHS[key]})
+            yield sse("phase_end", {"name": "文档预处理"})
+
+            # --- 阶段 2-5: 顺序执行各项提取 ---
+            # --- 核心改动：根据 stream_token_deltas 的值，选择执行模式 ---
+            if stream_token_deltas:
+                # --- 模式一：四个阶段并发执行，经共享队列实时推送全部 Token 流 (便于调试) ---
+                yield sse("note", {"phase": "分析", "text": "以并发模式启动分析，将实时推送全部 Token 流..."})
+                event_queue: asyncio.Queue = asyncio.Queue()
+                phase_tasks = [
+                    asyncio.create_task(pump_phase_events(
+                        run_extraction_phase(name, key, factory, final_chunks_with_meta, run_config, mcp_client, language),
+                        event_queue,
+                    ))
+                    for name, key, factory in (
+                        ("商务要求", "business", business_requirement_extractor_agent),
+                        ("技术要求", "technical", technical_requirement_extractor_agent),
+                        ("报价要求", "pricing", pricing_requirement_extractor_agent),
+                        ("评分要求", "scoring", scoring_requirement_extractor_agent),
+                    )
+                ]
+                try:
+                    remaining = len(phase_tasks)
+                    while remaining:
+                        event = await event_queue.get()
+                        if event is _PHASE_DONE:
+                            remaining -= 1
+                            continue
+                        yield event
+                    # 所有阶段均已结束；若有阶段抛出异常，在此向上传递
+                    await asyncio.gather(*phase_tasks)
+                finally:
+                    for task in phase_tasks:
+                        if not task.done():
+                            task.cancel()
+            else:
+                # --- 模式三：并行执行，但实时推送一个任务的流 (兼顾效率与反馈) ---
+                yield sse("phase_start", {"name": "并行分析"})
+                yield sse("note", {"phase": "并行分析", "text": "以并行模式启动分析，将实时推送其中一个任务的进度流..."})
 
-            async with mcp_client:
                 all_phases = {
                     "business": ("商务要求", business_requirement_extractor_agent),
                     "technical": ("技术要求", technical_requirement_extractor_agent),
@@ -526,7 +748,7 @@ async def event_generator(
                     background_tasks = []
                     for key, (name, factory) in all_phases.items():
                         task_coro = run_phase_and_collect_artifacts(
-                            run_extraction_phase(name, key, factory, final_chunks_with_meta, run_config, mcp_client, language)
+                            run_extraction_phase(name, key, factory, final_chunks_with_meta, run_config, mcp_client, language, stream_tokens=False)
                         )
                         background_tasks.append(asyncio.create_task(task_coro))
 
@@ -546,198 +768,212 @@ async def event_generator(
                                 yield event
                         yield sse("note", {"phase": "并行分析", "text": "所有后台任务均已完成。"})
 
-            yield sse("phase_end", {"name": "并行分析"})
+                yield sse("phase_end", {"name": "并行分析"})
 
-        # --- 阶段 6: 模版提取 (v4.0 终极版流水线) ---
-        yield sse("phase_start", {"name": "模版提取"})
+            # --- 阶段 6: 模版提取 (v4.0 终极版流水线) ---
+            yield sse("phase_start", {"name": "模版提取"})
         
-        # --- 步骤 A: 识别与打标 ---
-        yield sse("note", {"phase": "模版提取", "text": "步骤 A: 正在进行初步识别与打标..."})
-        standard_agent = standard_template_extractor_agent(language=language)
-        all_found_templates = []
-        async with mcp_client:
-            for i, chunk_info in enumerate(final_chunks_with_meta):
-                result = await Runner.run(standard_agent, 
-                    f"请从以下文本中提取模版：\n\n---\n\n{chunk_info['content']}", 
-                    run_config=run_config
+            # --- 步骤 A: 识别与打标 ---
+            yield sse("note", {"phase": "模版提取", "text": "步骤 A: 正在进行初步识别与打标..."})
+            standard_agent = standard_template_extractor_agent(language=language)
+            all_found_templates = []
+            # 各文本块相互独立，并发识别（受 MAX_CONCURRENT_LLM_CALLS 限制），结果按块顺序处理
+            standard_results_per_chunk = await asyncio.gather(*[
+                run_agent_limited(
+                    standard_agent,
+                    f"请从以下文本中提取模版：\n\n---\n\n{chunk_info['content']}",
+                    run_config,
                 )
+                for chunk_info in final_chunks_with_meta
+            ])
+            for i, result in enumerate(standard_results_per_chunk):
                 try:
-                    json_str = result.final_output.strip().replace("`", "")
-                    if json_str.startswith("json"): json_str = json_str[4:]
-                    
-                    templates_from_chunk = json.loads(json_str)
+                    templates_from_chunk = _parse_llm_json(result.final_output)
 
                     if isinstance(templates_from_chunk, list):
                         for template in templates_from_chunk:
                             template["source_chunk_ids"] = [i]
                         all_found_templates.extend(templates_from_chunk)
-                except (json.JSONDecodeError, AttributeError, TypeError):
-                    pass # Silently ignore parsing errors in production
+                except (ValueError, TypeError) as e:
+                    yield sse("warning", {"phase": "模版提取", "text": f"步骤 A: 块 {i+1} 的识别结果解析失败，已跳过: {e}"})
         
-        # --- 步骤 B: 分诊 ---
-        yield sse("note", {"phase": "模版提取", "text": "步骤 B: 正在对模板进行分诊..."})
-        standard_results = [tpl for tpl in all_found_templates if tpl.get('key') is not None]
-        non_standard_to_process = [tpl for tpl in all_found_templates if tpl.get('key') is None]
-        yield sse("note", {"phase": "模版提取", "text": f"分诊完成：{len(standard_results)} 个标准模板，{len(non_standard_to_process)} 个待处理非标模板。"})
-
-        # --- 步骤 C: 专家会诊 (非标提取) ---
-        yield sse("note", {"phase": "模版提取", "text": "步骤 C: 正在进行非标提取（攻坚）..."})
-        non_standard_agent = non_standard_template_extractor_agent(language=language)
-        non_standard_results = []
-        # 为了效率，我们将所有非标模板按其来源文本块进行分组
-        grouped_to_process = {}
-        for tpl in non_standard_to_process:
-            # --- 核心改动：使用新的、正确的 `source_chunk_ids` 字段 ---
-            if tpl.get("source_chunk_ids"):
-                chunk_idx = tpl['source_chunk_ids'][0]
-                if chunk_idx not in grouped_to_process:
-                    grouped_to_process[chunk_idx] = []
-                grouped_to_process[chunk_idx].append(tpl) # 传递完整的 tpl 对象
-
-        async with mcp_client:
-            for chunk_idx, templates_in_chunk in grouped_to_process.items():
+            # --- 步骤 B: 分诊 ---
+            yield sse("note", {"phase": "模版提取", "text": "步骤 B: 正在对模板进行分诊..."})
+            standard_results = [tpl for tpl in all_found_templates if tpl.get('key') is not None]
+            non_standard_to_process = [tpl for tpl in all_found_templates if tpl.get('key') is None]
+            yield sse("note", {"phase": "模版提取", "text": f"分诊完成：{len(standard_results)} 个标准模板，{len(non_standard_to_process)} 个待处理非标模板。"})
+
+            # --- 步骤 C: 专家会诊 (非标提取) ---
+            yield sse("note", {"phase": "模版提取", "text": "步骤 C: 正在进行非标提取（攻坚）..."})
+            non_standard_agent = non_standard_template_extractor_agent(language=language)
+            non_standard_results = []
+            # 为了效率，我们将所有非标模板按其来源文本块进行分组
+            grouped_to_process: Dict[int, List[Dict[str, Any]]] = defaultdict(list)
+            for tpl in non_standard_to_process:
+                # --- 核心改动：使用新的、正确的 `source_chunk_ids` 字段 ---
+                if tpl.get("source_chunk_ids"):
+                    grouped_to_process[tpl['source_chunk_ids'][0]].append(tpl) # 传递完整的 tpl 对象
+
+            def build_non_standard_prompt(chunk_idx: int, templates_in_chunk: List[Dict[str, Any]]) -> str:
                 chunk_text = final_chunks_with_meta[chunk_idx]['content']
-                # --- 核心改动：从 tpl 对象中提取 name ---
-                names_to_extract = [t['name'] for t in templates_in_chunk]
+                # --- 核心改动：从 tpl 对象中提取 name（同一块内重复的名称只请求一次，保持原有顺序） ---
+                names_to_extract = list(dict.fromkeys(t['name'] for t in templates_in_chunk))
                 names_str = ", ".join(f"'{n}'" for n in names_to_extract)
-                
-                result = await Runner.run(
-                    non_standard_agent,
-                    f"待提取的模板名称列表: [{names_str}]\n\n---\n\n招标文件文本:\n{chunk_text}",
-                    run_config=run_config
-                )
+                return f"待提取的模板名称列表: [{names_str}]\n\n---\n\n招标文件文本:\n{chunk_text}"
+
+            # 各文本块的非标提取相互独立，并发调用（受 MAX_CONCURRENT_LLM_CALLS 限制）；
+            # 单块失败只产生警告，不影响其余块
+            non_standard_results_per_chunk = await asyncio.gather(*[
+                run_agent_limited(non_standard_agent, build_non_standard_prompt(chunk_idx, templates_in_chunk), run_config)
+                for chunk_idx, templates_in_chunk in grouped_to_process.items()
+            ], return_exceptions=True)
+
+            for chunk_idx, result in zip(grouped_to_process, non_standard_results_per_chunk):
+                if isinstance(result, Exception):
+                    yield sse("warning", {"phase": "模版提取", "text": f"步骤 C: 块 {chunk_idx+1} 的非标提取调用失败，已跳过: {result}"})
+                    continue
                 try:
-                    json_str = result.final_output.strip().replace("`", "")
-                    if json_str.startswith("json"): json_str = json_str[4:]
-                    
-                    templates_from_chunk = json.loads(json_str)
+                    templates_from_chunk = _parse_llm_json(result.final_output)
 
                     if isinstance(templates_from_chunk, list):
                         non_standard_results.extend(templates_from_chunk)
-                except (json.JSONDecodeError, AttributeError, TypeError):
-                    pass # Silently ignore
-        yield sse("note", {"phase": "模版提取", "text": f"步骤 C 完成：成功提取 {len(non_standard_results)} 个非标模板。"})
+                except (ValueError, TypeError) as e:
+                    yield sse("warning", {"phase": "模版提取", "text": f"步骤 C: 块 {chunk_idx+1} 的非标提取结果解析失败，已跳过: {e}"})
+            yield sse("note", {"phase": "模版提取", "text": f"步骤 C 完成：成功提取 {len(non_standard_results)} 个非标模板。"})
         
-        # --- 步骤 D: 结果汇总与最终处理 ---
-        yield sse("note", {"phase": "模版提取", "text": "步骤 D: 正在合并、去重并格式化..."})
+            # --- 步骤 D: 结果汇总与最终处理 ---
+            yield sse("note", {"phase": "模版提取", "text": "步骤 D: 正在合并、去重并格式化..."})
         
-        final_results = []
-        processed_names = set()
-
-        # 首先处理标准模板结果，应用严格的字段控制
-        for std_tpl in standard_results:
-            name = std_tpl.get("name", "").strip()
-            if name and name not in processed_names:
-                final_results.append({
-                    "id": f"tpl_{uuid.uuid4().hex[:8]}",
-                    "name": name,
-                    "title": std_tpl.get("key") 
-                })
-                processed_names.add(name)
-
-        # 然后处理非标模板结果，应用严格的字段控制和安全的 .get() 访问
-        for ns_tpl in non_standard_results:
-            name = ns_tpl.get("name", "").strip()
-            if name and name not in processed_names:
-                # 严格的字段控制，并使用 .get() 方法确保安全
-                final_results.append({
-                    "id": f"tpl_{uuid.uuid4().hex[:8]}",
-                    "name": name,
-                    "start": ns_tpl.get("start"),
-                    "end": ns_tpl.get("end"),
-                    "keywords": ns_tpl.get("keywords", [])
-                })
-                processed_names.add(name)
-
-        yield sse("note", {"phase": "模版提取", "text": f"步骤 D 完成：共生成 {len(final_results)} 个最终模板记录。"})
+            final_results = []
+            processed_names = set()
+
+            # 首先处理标准模板结果，应用严格的字段控制
+            for std_tpl in standard_results:
+                name = std_tpl.get("name", "").strip()
+                if name and name not in processed_names:
+                    final_results.append({
+                        "id": f"tpl_{uuid.uuid4().hex[:8]}",
+                        "name": name,
+                        "title": std_tpl.get("key") 
+                    })
+                    processed_names.add(name)
+
+            # 然后处理非标模板结果，应用严格的字段控制和安全的 .get() 访问
+            for ns_tpl in non_standard_results:
+                name = ns_tpl.get("name", "").strip()
+                if name and name not in processed_names:
+                    # 严格的字段控制，并使用 .get() 方法确保安全
+                    final_results.append({
+                        "id": f"tpl_{uuid.uuid4().hex[:8]}",
+                        "name": name,
+                        "start": ns_tpl.get("start"),
+                        "end": ns_tpl.get("end"),
+                        "keywords": ns_tpl.get("keywords", [])
+                    })
+                    processed_names.add(name)
+
+            yield sse("note", {"phase": "模版提取", "text": f"步骤 D 完成：共生成 {len(final_results)} 个最终模板记录。"})
         
-        # 写入最终的 JSON 文件
-        final_json_content = json.dumps(final_results, ensure_ascii=False, indent=4)
-        async with mcp_client:
+            # 写入最终的 JSON 文件
+            final_json_content = orjson.dumps(final_results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
             await mcp_smart_write(mcp_client, OUTPUT_PATHS["template"], final_json_content)
         
-        yield sse("artifact", {"type": "file", "filename": OUTPUT_PATHS["template"]})
-        yield sse("phase_end", {"name": "模版提取"})
-
-        # --- 阶段 7: 最终清单整合 (从 test_checklist_pipeline.py 移植) ---
-        yield sse("phase_start", {"name": "最终清单整合"})
-
-        # --- 步骤 7.1: 读取所有分析报告 ---
-        yield sse("note", {"phase": "最终清单整合", "text": "步骤 A: 正在读取所有分析报告..."})
-        report_keys = ["scoring", "business", "technical", "pricing"]
-        report_contents: Dict[str, str] = {}
-        async with mcp_client:
-            tasks = [mcp_read_file(mcp_client, OUTPUT_PATHS[key]) for key in report_keys]
-            results = await asyncio.gather(*tasks)
-            
-            for key, content in zip(report_keys, results):
-                if content is None:
-                    yield sse("warning", {"phase": "最终清单整合", "text": f"警告：未找到分析报告 '{OUTPUT_PATHS[key]}'，该部分可能不完整。"})
-                    report_contents[key] = ""
-                else:
-                    report_contents[key] = content
+            yield sse("artifact", {"type": "file", "filename": OUTPUT_PATHS["template"]})
+            yield sse("phase_end", {"name": "模版提取"})
+
+            # --- 阶段 7: 最终清单整合 (从 test_checklist_pipeline.py 移植) ---
+            yield sse("phase_start", {"name": "最终清单整合"})
+
+            # --- 步骤 7.1: 读取所有分析报告 ---
+            yield sse("note", {"phase": "最终清单整合", "text": "步骤 A: 正在读取所有分析报告..."})
+            # 大纲只依赖评分报告：先发起评分报告的读取，其余报告在后台并发读取，
+            # 富化到对应部分时再取结果，使读取与大纲构建的 LLM 调用重叠
+            scoring_read = asyncio.create_task(mcp_read_file(mcp_client, OUTPUT_PATHS["scoring"]))
+            report_reads: Dict[str, asyncio.Task] = {
+                key: asyncio.create_task(mcp_read_file(mcp_client, OUTPUT_PATHS[key]))
+                for key in ["business", "technical", "pricing"]
+            }
+            read_tasks.extend([scoring_read, *report_reads.values()])
+            scoring_content = await scoring_read
         
-        if not report_contents.get("scoring"):
-            yield sse("error", {"type": "MissingInputError", "message": "无法进行清单整合，因为评分报告缺失。"})
-            return
-
-        # --- 步骤 7.2: 构建“评分驱动”的大纲 ---
-        yield sse("note", {"phase": "最终清单整合", "text": "步骤 B: 正在构建“评分驱动”的清单大纲..."})
-        outline_agent = checklist_outline_agent(language=language)
-        outline_result = await Runner.run(
-            outline_agent,
-            f"请根据以下评分要求文档，创建清单大纲：\n\n---\n\n{report_contents['scoring']}",
-            run_config=run_config
-        )
-        checklist_outline = outline_result.final_output
+            if scoring_content is None:
+                yield sse("warning", {"phase": "最终清单整合", "text": f"警告：未找到分析报告 '{OUTPUT_PATHS['scoring']}'，该部分可能不完整。"})
+            if not scoring_content:
+                yield sse("error", {"type": "MissingInputError", "message": "无法进行清单整合，因为评分报告缺失。"})
+                return
+
+            # --- 步骤 7.2: 构建“评分驱动”的大纲 ---
+            yield sse("note", {"phase": "最终清单整合", "text": "步骤 B: 正在构建“评分驱动”的清单大纲..."})
+            outline_agent = checklist_outline_agent(language=language)
+            outline_result = await Runner.run(
+                outline_agent,
+                f"请根据以下评分要求文档，创建清单大纲：\n\n---\n\n{scoring_content}",
+                run_config=run_config
+            )
+            checklist_outline = outline_result.final_output
         
-        # 保存并推送大纲产物
-        outline_filename = "checklist_outline.md"
-        async with mcp_client:
-            await mcp_smart_write(mcp_client, outline_filename, checklist_outline)
-        yield sse("artifact", {"type": "file", "filename": outline_filename})
-        yield sse("note", {"phase": "最终清单整合", "text": "清单大纲构建完成。"})
-
-        # --- 步骤 7.3: 拆分大纲并分三次富化 ---
-        yield sse("note", {"phase": "最终清单整合", "text": "步骤 C: 正在分三次、逐部分地填充大纲..."})
-        outline_sections = split_outline_by_headings(checklist_outline)
-        enrichment_agent = checklist_enrichment_agent(language=language)
-        final_checklist_parts: List[str] = []
-
-        process_order = ["business", "technical", "pricing"]
-        for section_key in process_order:
-            if section_key in outline_sections:
-                yield sse("update", {"phase": "最终清单整合", "progress": f"正在处理 {section_key} 部分..."})
+            # 大纲产物在后台写入，与后续富化步骤并发
+            outline_filename = "checklist_outline.md"
+            outline_write = asyncio.create_task(mcp_smart_write(mcp_client, outline_filename, checklist_outline))
+            write_tasks.append(outline_write)
+            yield sse("note", {"phase": "最终清单整合", "text": "清单大纲构建完成。"})
+
+            # --- 步骤 7.3: 拆分大纲并分三次富化 ---
+            yield sse("note", {"phase": "最终清单整合", "text": "步骤 C: 正在分三次、逐部分地填充大纲..."})
+            outline_sections = split_outline_by_headings(checklist_outline)
+            # 大纲中没有对应部分的报告用不到，取消其读取
+            for key, task in report_reads.items():
+                if key not in outline_sections:
+                    task.cancel()
+            enrichment_agent = checklist_enrichment_agent(language=language)
+            final_checklist_parts: List[str] = []
+
+            process_order = ["business", "technical", "pricing"]
+            for section_key in process_order:
+                if section_key in outline_sections:
+                    yield sse("update", {"phase": "最终清单整合", "progress": f"正在处理 {section_key} 部分..."})
                 
-                outline_part = outline_sections[section_key]
-                report_content = report_contents.get(section_key, '无相关报告内容')
-
-                full_context_input = (
-                    f"# 核心行动大纲 (当前部分)\n\n{outline_part}\n\n"
-                    f"---\n\n# 详细需求报告 (对应部分)\n\n{report_content}"
-                )
+                    outline_part = outline_sections[section_key]
+                    report_content = await report_reads[section_key]
+                    if report_content is None:
+                        yield sse("warning", {"phase": "最终清单整合", "text": f"警告：未找到分析报告 '{OUTPUT_PATHS[section_key]}'，该部分可能不完整。"})
+                        report_content = ""
+
+                    full_context_input = (
+                        f"# 核心行动大纲 (当前部分)\n\n{outline_part}\n\n"
+                        f"---\n\n# 详细需求报告 (对应部分)\n\n{report_content}"
+                    )
                 
-                enriched_part_result = await Runner.run(
-                    enrichment_agent, full_context_input, run_config=run_config
-                )
-                enriched_part = enriched_part_result.final_output
-                final_checklist_parts.append(enriched_part)
-                yield sse("note", {"phase": "最终清单整合", "text": f"{section_key} 部分填充完成。"})
-
-        # --- 步骤 7.4: 合并并保存最终清单 ---
-        yield sse("note", {"phase": "最终清单整合", "text": "步骤 D: 正在合并并保存最终清单..."})
-        final_checklist = "\n\n---\n\n".join(final_checklist_parts)
-        final_checklist_filename = "final_checklist.md"
+                    enriched_part_result = await Runner.run(
+                        enrichment_agent, full_context_input, run_config=run_config
+                    )
+                    enriched_part = enriched_part_result.final_output
+                    final_checklist_parts.append(enriched_part)
+                    yield sse("note", {"phase": "最终清单整合", "text": f"{section_key} 部分填充完成。"})
+
+            # --- 步骤 7.4: 合并并保存最终清单 ---
+            yield sse("note", {"phase": "最终清单整合", "text": "步骤 D: 正在合并并保存最终清单..."})
+            final_checklist = "\n\n---\n\n".join(final_checklist_parts)
+            final_checklist_filename = "final_checklist.md"
         
-        async with mcp_client:
-            await mcp_smart_write(mcp_client, final_checklist_filename, final_checklist)
+            await asyncio.gather(
+                outline_write,
+                mcp_smart_write(mcp_client, final_checklist_filename, final_checklist),
+            )
         
-        yield sse("artifact", {"type": "file", "filename": final_checklist_filename})
-        yield sse("phase_end", {"name": "最终清单整合"})
+            yield sse("artifact", {"type": "file", "filename": outline_filename})
+            yield sse("artifact", {"type": "file", "filename": final_checklist_filename})
+            yield sse("phase_end", {"name": "最终清单整合"})
 
-        # --- 流水线结束 ---
-        yield sse("complete", {"final_output": "所有分析阶段均已完成！"})
+            # --- 流水线结束 ---
+            yield sse("complete", {"final_output": "所有分析阶段均已完成！"})
 
-    except Exception as e:
-        error_info = {"type": type(e).__name__, "message": str(e)}
-        yield sse("error", error_info)
+        except Exception as e:
+            error_info = {"type": type(e).__name__, "message": str(e)}
+            yield sse("error", error_info)
+        finally:
+            # 提前退出（出错或客户端断开）时，取消尚未完成的读取，等待仍在进行的写入完成后再关闭会话，
+            # 避免留下写到一半的产物；同时取回任务结果，不产生未处理的任务异常
+            for task in read_tasks:
+                task.cancel()
+            await asyncio.gather(*write_tasks, *read_tasks, return_exceptions=True)